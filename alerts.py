@@ -0,0 +1,23 @@
+import asyncio
+import logging
+
+import discord
+
+from settings import settings
+
+# --- Diffusion des alertes ---
+# Une alerte part dans le salon configuré (champ `field` de settings) de
+# chaque serveur de ce processus. bot.guilds ne contient que les serveurs de
+# nos shards : avec des shards répartis, chaque processus annonce uniquement
+# sur ses propres serveurs. Le texte vient en partie de l'extérieur (titres de
+# stream, pseudos Twitch, tweets) : aucune mention n'est jamais déclenchée.
+
+
+async def broadcast(bot, field: str, content: str):
+    channels = [g.get_channel(getattr(settings.guild(g.id), field)) for g in bot.guilds]
+    channels = [ch for ch in channels if ch]
+    results = await asyncio.gather(*(ch.send(content, allowed_mentions=discord.AllowedMentions.none()) for ch in channels), return_exceptions=True)
+    for ch, result in zip(channels, results):
+        if isinstance(result, Exception):
+            logging.warning(f"Alerte non envoyée dans {ch.id} : {result}")
+    return len(channels)
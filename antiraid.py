@@ -0,0 +1,162 @@
+import time
+from collections import deque, OrderedDict, namedtuple
+
+# --- Détection de raids et de spam ---
+# Alimenté directement par les événements gateway (messages, arrivées).
+# Chaque utilisateur suivi a des tampons circulaires de taille fixe (horodatages
+# de messages, empreintes de contenu) : mémoire constante par utilisateur, et
+# les utilisateurs inactifs sont évincés (LRU). Chaque serveur a un tampon des
+# dernières arrivées pour repérer les vagues de joins.
+# Le moteur ne parle pas à Discord : il renvoie des Action que le bot exécute.
+
+Action = namedtuple("Action", "kind guild_id user_ids reason")
+
+
+class Thresholds:
+    __slots__ = ("msg_count", "msg_window", "dup_count", "dup_window",
+                 "join_count", "join_window", "lockdown_cooldown", "ban_raiders")
+
+    def __init__(self, msg_count=6, msg_window=5.0, dup_count=4, dup_window=30.0,
+                 join_count=10, join_window=10.0, lockdown_cooldown=600.0, ban_raiders=False):
+        self.msg_count = msg_count
+        self.msg_window = msg_window
+        self.dup_count = dup_count
+        self.dup_window = dup_window
+        self.join_count = join_count
+        self.join_window = join_window
+        self.lockdown_cooldown = lockdown_cooldown
+        self.ban_raiders = ban_raiders
+
+    @classmethod
+    def from_config(cls, common):
+        # common : settings.common (champs spam_* / raid_*)
+        return cls(
+            msg_count=common.spam_msg_count,
+            msg_window=common.spam_msg_window,
+            dup_count=common.spam_dup_count,
+            dup_window=common.spam_dup_window,
+            join_count=common.raid_join_count,
+            join_window=common.raid_join_window,
+            lockdown_cooldown=common.raid_lockdown_cooldown,
+            ban_raiders=common.raid_ban
+        )
+
+    def __eq__(self, other):
+        return isinstance(other, Thresholds) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+
+class _UserTrack:
+    __slots__ = ("messages", "hashes", "last_seen")
+
+    def __init__(self, t: Thresholds):
+        self.messages = deque(maxlen=t.msg_count)
+        self.hashes = deque(maxlen=t.dup_count * 2)  # (instant, empreinte)
+        self.last_seen = 0.0
+
+
+class _GuildTrack:
+    __slots__ = ("joins", "locked_until")
+
+    def __init__(self, t: Thresholds):
+        self.joins = deque(maxlen=t.join_count)  # (instant, user_id)
+        self.locked_until = 0.0
+
+
+class RaidDetector:
+    def __init__(self, thresholds: Thresholds = None, max_users=50000, idle_ttl=600.0):
+        self.t = thresholds or Thresholds()
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        self.users = OrderedDict()  # (guild_id, user_id) -> _UserTrack, du moins au plus récent
+        self.guilds = {}
+        self.stats = {"messages": 0, "joins": 0, "actions": 0, "evicted": 0}
+
+    def configure(self, thresholds: Thresholds):
+        # Rechargement à chaud : les tampons sont dimensionnés sur les seuils,
+        # ils repartent de zéro (les lockdowns en cours sont gardés)
+        if thresholds == self.t:
+            return
+        self.t = thresholds
+        self.users.clear()
+        for guild in self.guilds.values():
+            guild.joins = deque(maxlen=thresholds.join_count)
+
+    def _user(self, key, now):
+        track = self.users.get(key)
+        if track is None:
+            track = self.users[key] = _UserTrack(self.t)
+        else:
+            self.users.move_to_end(key)
+        track.last_seen = now
+        self._evict(now)
+        return track
+
+    def _evict(self, now):
+        users = self.users
+        while users:
+            key, oldest = next(iter(users.items()))
+            if len(users) <= self.max_users and now - oldest.last_seen < self.idle_ttl:
+                break
+            users.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def _guild(self, guild_id):
+        track = self.guilds.get(guild_id)
+        if track is None:
+            track = self.guilds[guild_id] = _GuildTrack(self.t)
+        return track
+
+    def on_message(self, guild_id, user_id, content, now=None):
+        now = time.monotonic() if now is None else now
+        self.stats["messages"] += 1
+        t = self.t
+        track = self._user((guild_id, user_id), now)
+        track.messages.append(now)
+        if len(track.messages) == t.msg_count and now - track.messages[0] <= t.msg_window:
+            return self._timeout(guild_id, user_id, track, f"{t.msg_count} messages en {t.msg_window:g}s")
+        if content:
+            digest = hash(content.strip().lower())
+            track.hashes.append((now, digest))
+            same = sum(1 for ts, h in track.hashes if h == digest and now - ts <= t.dup_window)
+            if same >= t.dup_count:
+                return self._timeout(guild_id, user_id, track, f"{same} messages identiques en {t.dup_window:g}s")
+        return []
+
+    def _timeout(self, guild_id, user_id, track, reason):
+        # Remise à zéro pour ne pas re-sanctionner sur les mêmes messages
+        track.messages.clear()
+        track.hashes.clear()
+        self.stats["actions"] += 1
+        return [Action("timeout", guild_id, (user_id,), reason)]
+
+    def on_join(self, guild_id, user_id, now=None):
+        now = time.monotonic() if now is None else now
+        self.stats["joins"] += 1
+        t = self.t
+        guild = self._guild(guild_id)
+        guild.joins.append((now, user_id))
+        if len(guild.joins) < t.join_count or now - guild.joins[0][0] > t.join_window:
+            return []
+        raiders = tuple(uid for ts, uid in guild.joins)
+        actions = []
+        if now >= guild.locked_until:
+            guild.locked_until = now + t.lockdown_cooldown
+            actions.append(Action("lockdown", guild_id, (), f"{t.join_count} arrivées en {t.join_window:g}s"))
+        if t.ban_raiders:
+            actions.append(Action("ban", guild_id, raiders, "Raid détecté"))
+            guild.joins.clear()
+        self.stats["actions"] += len(actions)
+        return actions
+
+    def is_locked(self, guild_id, now=None):
+        now = time.monotonic() if now is None else now
+        guild = self.guilds.get(guild_id)
+        return bool(guild and now < guild.locked_until)
+
+    def unlock(self, guild_id):
+        guild = self.guilds.get(guild_id)
+        if guild:
+            guild.locked_until = 0.0
+            guild.joins.clear()
@@ -0,0 +1,95 @@
+import sys
+from collections import OrderedDict
+
+# --- Cache des messages pour l'audit (suppressions / éditions) ---
+# Ne garde que ce dont le journal a besoin, dans des objets à slots :
+# auteur, salon, contenu tronqué et URLs des pièces jointes. Chaque salon a
+# sa propre LRU bornée, et le nombre de salons suivis est lui aussi borné,
+# ce qui plafonne la mémoire indépendamment du cache de discord.py.
+
+MAX_CONTENT = 500
+
+
+class CachedMessage:
+    __slots__ = ("id", "channel_id", "author_id", "bot", "content", "attachments")
+
+    def __init__(self, id, channel_id, author_id, bot, content, attachments):
+        self.id = id
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.bot = bot
+        self.content = content
+        self.attachments = attachments
+
+
+class AuditCache:
+    def __init__(self, per_channel=200, max_channels=500, max_content=MAX_CONTENT):
+        self.per_channel = per_channel
+        self.max_channels = max_channels
+        self.max_content = max_content
+        self.channels = OrderedDict()  # channel_id -> OrderedDict(message_id -> CachedMessage)
+        self.stats = {"hits": 0, "misses": 0}
+
+    def resize(self, per_channel):
+        # Nouvelle limite (rechargement de la configuration) : les salons sont retaillés tout de suite
+        self.per_channel = per_channel
+        for channel in self.channels.values():
+            while len(channel) > per_channel:
+                channel.popitem(last=False)
+
+    def _truncate(self, content):
+        if len(content) > self.max_content:
+            return content[:self.max_content - 1] + "…"
+        return content
+
+    def add(self, message):
+        channel = self.channels.get(message.channel.id)
+        if channel is None:
+            channel = self.channels[message.channel.id] = OrderedDict()
+            if len(self.channels) > self.max_channels:
+                self.channels.popitem(last=False)
+        else:
+            self.channels.move_to_end(message.channel.id)
+        if message.author.bot:
+            # Les messages du bot sont marqués sans contenu, pour ne pas journaliser leurs suppressions
+            entry = CachedMessage(message.id, message.channel.id, message.author.id, True, "", ())
+        else:
+            entry = CachedMessage(
+                message.id, message.channel.id, message.author.id, False,
+                self._truncate(message.content), tuple(a.url for a in message.attachments)
+            )
+        channel[message.id] = entry
+        if len(channel) > self.per_channel:
+            channel.popitem(last=False)
+
+    def get(self, channel_id, message_id):
+        entry = self.channels.get(channel_id, {}).get(message_id)
+        self.stats["hits" if entry else "misses"] += 1
+        return entry
+
+    def pop(self, channel_id, message_id):
+        channel = self.channels.get(channel_id)
+        entry = channel.pop(message_id, None) if channel else None
+        self.stats["hits" if entry else "misses"] += 1
+        return entry
+
+    def update_content(self, entry, content):
+        # Renvoie False si le contenu (tronqué) n'a pas changé
+        content = self._truncate(content)
+        if content == entry.content:
+            return False
+        entry.content = content
+        return True
+
+    def __len__(self):
+        return sum(len(c) for c in self.channels.values())
+
+    def memory(self):
+        # Estimation en octets des structures du cache (objets, chaînes, dicts)
+        total = sys.getsizeof(self.channels)
+        for channel in self.channels.values():
+            total += sys.getsizeof(channel)
+            for entry in channel.values():
+                total += sys.getsizeof(entry) + sys.getsizeof(entry.content) + sys.getsizeof(entry.attachments)
+                total += sum(sys.getsizeof(url) for url in entry.attachments)
+        return total
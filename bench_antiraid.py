@@ -0,0 +1,79 @@
+import sys
+import time
+import random
+import tracemalloc
+
+from antiraid import RaidDetector, Thresholds
+
+# Rejoue un trafic synthétique (serveur actif + raid + spammeurs) dans le
+# détecteur et mesure débit, latence de détection et mémoire :
+#   python bench_antiraid.py [nb_messages]
+
+GUILD = 1
+RAID_SIZE = 300
+
+
+def traffic(n_messages, n_users=20000, seed=42):
+    rnd = random.Random(seed)
+    now = 0.0
+    raid_at = n_messages // 2
+    spammers = {rnd.randrange(n_users) for _ in range(20)}
+    for i in range(n_messages):
+        now += rnd.expovariate(200)  # ~200 messages/s
+        if i == raid_at:
+            # Vague de comptes qui rejoignent en quelques secondes puis spamment
+            for r in range(RAID_SIZE):
+                now += 0.01
+                yield "join", 10_000_000 + r, now, None
+            for burst in range(8):
+                for r in range(RAID_SIZE):
+                    yield "message", 10_000_000 + r, now + burst * 0.2, "JOIN discord.gg/free-nitro"
+        user = rnd.randrange(n_users)
+        if user in spammers and rnd.random() < 0.5:
+            yield "message", user, now, "achetez mes followers"
+        else:
+            yield "message", user, now, f"message {rnd.randrange(1_000_000)}"
+
+
+def main(n_messages):
+    detector = RaidDetector(Thresholds(), max_users=10000, idle_ttl=120)
+    events = list(traffic(n_messages))
+    first_join = lockdown_at = None
+    timeouts = set()
+    start = time.perf_counter()
+    for idx, (kind, user, ts, content) in enumerate(events):
+        if kind == "join":
+            first_join = idx if first_join is None else first_join
+            actions = detector.on_join(GUILD, user, ts)
+        else:
+            actions = detector.on_message(GUILD, user, content, ts)
+        for a in actions:
+            if a.kind == "lockdown" and lockdown_at is None:
+                lockdown_at = idx
+            elif a.kind == "timeout":
+                timeouts.update(a.user_ids)
+    elapsed = time.perf_counter() - start
+
+    # Mémoire mesurée sur une seconde passe, tracemalloc faussant le chrono
+    replay = RaidDetector(Thresholds(), max_users=10000, idle_ttl=120)
+    tracemalloc.start()
+    for kind, user, ts, content in events:
+        if kind == "join":
+            replay.on_join(GUILD, user, ts)
+        else:
+            replay.on_message(GUILD, user, content, ts)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    raiders_caught = sum(1 for u in timeouts if u >= 10_000_000)
+    print(f"Événements        : {len(events)} en {elapsed:.3f}s ({len(events) / elapsed:,.0f}/s, "
+          f"{elapsed / len(events) * 1e6:.2f} µs/événement)")
+    print(f"Lockdown          : {lockdown_at - first_join + 1} arrivées après le début du raid"
+          if lockdown_at is not None else "Lockdown          : non déclenché")
+    print(f"Timeouts          : {len(timeouts)} utilisateurs ({raiders_caught}/{RAID_SIZE} raiders)")
+    print(f"Utilisateurs suivis : {len(detector.users)} (évincés : {detector.stats['evicted']})")
+    print(f"Mémoire pic       : {peak / 1024 / 1024:.1f} Mo")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
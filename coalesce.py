@@ -0,0 +1,88 @@
+import json
+import asyncio
+import logging
+
+import discord
+
+from ratelimit import RateLimiter, PRIORITY_NORMAL
+
+# --- Regroupement des éditions de messages ---
+# Les changements d'état arrivant pendant `window` secondes sur un même
+# message sont fusionnés : le rendu n'est fait qu'une fois, à la fin de la
+# fenêtre, et l'édition est sautée si le contenu n'a pas changé. Chaque salon
+# a son seau (5 éditions / 5 s, la limite Discord) pour ne jamais aller au 429.
+
+EDITS_PER_CHANNEL = 5
+EDITS_WINDOW = 5
+
+
+def fingerprint(kwargs: dict) -> str:
+    out = {}
+    for k, v in kwargs.items():
+        if isinstance(v, discord.Embed):
+            out[k] = v.to_dict()
+        elif isinstance(v, discord.ui.View):
+            out[k] = v.to_components()
+        else:
+            out[k] = v
+    return json.dumps(out, sort_keys=True, default=str)
+
+
+class MessageUpdateCoalescer:
+    def __init__(self, window=1.0):
+        self.window = window
+        self._pending = {}  # message_id -> (message, render)
+        self._tasks = {}
+        self._last = {}     # message_id -> empreinte du dernier contenu envoyé
+        self._limiters = {}
+        self.stats = {"requested": 0, "sent": 0, "skipped": 0}
+
+    def prime(self, message_id, **kwargs):
+        # Contenu déjà envoyé à la création du message
+        self._last[message_id] = fingerprint(kwargs)
+
+    def schedule(self, message, render):
+        # `render()` renvoie les kwargs de message.edit, évalués en fin de fenêtre
+        self.stats["requested"] += 1
+        self._pending[message.id] = (message, render)
+        if message.id not in self._tasks:
+            self._tasks[message.id] = asyncio.create_task(self._run(message.id))
+
+    def forget(self, message_id):
+        task = self._tasks.pop(message_id, None)
+        if task and task is not asyncio.current_task():
+            task.cancel()
+        self._pending.pop(message_id, None)
+        self._last.pop(message_id, None)
+
+    def _limiter(self, channel_id):
+        limiter = self._limiters.get(channel_id)
+        if limiter is None:
+            limiter = RateLimiter(f"edit:{channel_id}", EDITS_PER_CHANNEL, EDITS_WINDOW, header_prefix="")
+            self._limiters[channel_id] = limiter
+        return limiter
+
+    async def _run(self, message_id):
+        try:
+            await asyncio.sleep(self.window)
+            message, render = self._pending.pop(message_id)
+            kwargs = render()
+            fp = fingerprint(kwargs)
+            if self._last.get(message_id) == fp:
+                self.stats["skipped"] += 1
+                return
+            await self._limiter(message.channel.id).acquire(PRIORITY_NORMAL)
+            await message.edit(**kwargs)
+            self._last[message_id] = fp
+            self.stats["sent"] += 1
+        except discord.NotFound:
+            self._pending.pop(message_id, None)
+            self._last.pop(message_id, None)
+        except discord.HTTPException as e:
+            logging.warning(f"Édition du message {message_id} impossible : {e}")
+        finally:
+            if self._tasks.get(message_id) is asyncio.current_task():
+                del self._tasks[message_id]
+                # Un changement arrivé pendant l'édition relance une fenêtre
+                if message_id in self._pending:
+                    self._tasks[message_id] = asyncio.create_task(self._run(message_id))
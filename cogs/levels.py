@@ -1,19 +1,267 @@
-from discord.ext import commands
+from discord.ext import commands, tasks
 import discord
-import asyncio
+import time
+import random
+
+from storage import load_data, save_data, GuildState
+from rankindex import RankIndex
+
+# Temps vocal : une session est ouverte tant que le membre est dans un salon
+# vocal, hors salon AFK et non sourd (muet compte : il écoute). Passer d'un
+# salon à l'autre ne coupe pas la session. Les durées s'accumulent en mémoire
+# et sont reportées dans "voice_time" par lots toutes les FLUSH_MINUTES ;
+# les sessions ouvertes sont sauvegardées au même moment dans
+# "voice_sessions" pour être reprises après un redémarrage court.
+#
+# XP des messages : XP_MIN à XP_MAX par message, au plus une fois par fenêtre
+# de XP_COOLDOWN secondes. Les fenêtres sont deux ensembles d'ids (courante et
+# précédente) qui tournent : rien n'est alloué par message, et l'écart entre
+# deux gains est toujours d'au moins une fenêtre. L'XP gagnée est cumulée en
+# mémoire puis reportée dans "xp" au même flush que le temps vocal.
+#
+# Tout est rangé par serveur (data["guild:<id>:<nom>"]) : chaque serveur a ses
+# totaux et ses classements. En mémoire, les clés sont des (guild_id, user_id).
+
+FLUSH_MINUTES = 2
+RECOVERY_WINDOW = 15 * 60
+XP_MIN, XP_MAX = 15, 25
+XP_COOLDOWN = 30
+
+
+def is_active(state):
+    if state is None or state.channel is None:
+        return False
+    if state.self_deaf or state.deaf:
+        return False
+    return state.channel != state.channel.guild.afk_channel
+
+
+def xp_for_level(level):
+    return 5 * level ** 2 + 50 * level + 100
+
+
+def level_from_xp(xp):
+    # Renvoie (niveau, xp dans le niveau, xp nécessaire pour le suivant)
+    level = 0
+    while xp >= xp_for_level(level):
+        xp -= xp_for_level(level)
+        level += 1
+    return level, xp, xp_for_level(level)
+
+
+def format_duration(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours}h{rest // 60:02d}"
+
 
 class Levels(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.user_times = {}
+        self.data = load_data()
+        self.totals = GuildState(self.data, "voice_time")
+        self.saved_sessions = GuildState(self.data, "voice_sessions")
+        self.xp = GuildState(self.data, "xp")
+        self.sessions = {}  # (guild_id, user_id) -> début de la session (epoch)
+        self.pending = {}   # (guild_id, user_id) -> secondes pas encore reportées
+        self.xp_pending = {}
+        self._indexes = {}  # (nom, guild_id) -> RankIndex, construit au premier accès
+        self._bucket = 0
+        self._current = set()   # (guild_id, user_id) ayant gagné de l'XP dans la fenêtre courante
+        self._previous = set()  # ... et dans la précédente
+        self.recovered = False
+        self._disconnected_at = None  # début de la coupure gateway en cours
+        self.flush_loop.start()
+
+    def cog_unload(self):
+        self.flush_loop.cancel()
+        # Avant recover(), flush() effacerait les sessions sauvegardées sans les avoir reprises
+        if self.recovered:
+            self.flush()
+
+    def index(self, state, guild_id):
+        key = (state.name, guild_id)
+        index = self._indexes.get(key)
+        if index is None:
+            index = self._indexes[key] = RankIndex(state(guild_id))
+        return index
+
+    def _close(self, key, now):
+        start = self.sessions.pop(key)
+        self.pending[key] = self.pending.get(key, 0) + now - start
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
-        if after.channel:
-            self.user_times[member.id] = asyncio.get_event_loop().time()
-        elif before.channel and member.id in self.user_times:
-            duration = asyncio.get_event_loop().time() - self.user_times.pop(member.id)
-            print(f"{member} est resté {duration / 3600:.2f} heures.")
-
-def setup(bot):
-    bot.add_cog(Levels(bot))
\ No newline at end of file
+        if member.bot:
+            return
+        key = (member.guild.id, str(member.id))
+        now = time.time()
+        active = is_active(after)
+        if key in self.sessions and not active:
+            self._close(key, now)
+        elif key not in self.sessions and active:
+            self.sessions[key] = now
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        if message.author.bot or not message.guild:
+            return
+        bucket = int(time.monotonic()) // XP_COOLDOWN
+        if bucket != self._bucket:
+            # Rotation : la fenêtre courante devient la précédente, l'ancienne est recyclée
+            if bucket == self._bucket + 1:
+                self._previous, self._current = self._current, self._previous
+            else:
+                self._previous.clear()
+            self._current.clear()
+            self._bucket = bucket
+        # Fenêtre propre à chaque serveur : un message ailleurs ne bloque pas l'XP ici
+        key = (message.guild.id, str(message.author.id))
+        if key in self._current or key in self._previous:
+            return
+        self._current.add(key)
+        self.xp_pending[key] = self.xp_pending.get(key, 0) + random.randint(XP_MIN, XP_MAX)
+
+    async def cog_load(self):
+        # Chargée à la demande (!extension load) : on_ready est déjà passé
+        if self.bot.is_ready():
+            self.recover()
+
+    @commands.Cog.listener()
+    async def on_disconnect(self):
+        if self._disconnected_at is None:
+            self._disconnected_at = time.time()
+
+    @commands.Cog.listener()
+    async def on_resumed(self):
+        # Session reprise : Discord rejoue les événements manqués
+        self._disconnected_at = None
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self.recovered:
+            self.resync()
+        else:
+            self.recover()
+
+    def active_members(self):
+        for guild in self.bot.guilds:
+            for channel in guild.voice_channels + guild.stage_channels:
+                for member in channel.members:
+                    if not member.bot and is_active(member.voice):
+                        yield guild.id, member
+
+    def resync(self):
+        # Reconnexion sans reprise : aucun événement vocal pour la coupure.
+        # Les sessions des membres partis sont closes à l'instant de la
+        # coupure (le départ exact est inconnu), les membres arrivés entre-temps
+        # sont comptés à partir de maintenant.
+        now = time.time()
+        gone_at = min(self._disconnected_at or now, now)
+        self._disconnected_at = None
+        active = {(guild_id, str(member.id)) for guild_id, member in self.active_members()}
+        for key in [k for k in self.sessions if k not in active]:
+            start = self.sessions[key]
+            self._close(key, max(gone_at, start))
+        for key in active:
+            self.sessions.setdefault(key, now)
+
+    def recover(self):
+        # Aucun on_voice_state_update n'arrive pour les membres déjà en vocal au démarrage
+        if self.recovered:
+            return
+        now = time.time()
+        for guild_id, member in self.active_members():
+            user_id = str(member.id)
+            start = self.saved_sessions(guild_id).get(user_id)
+            # Session reprise si l'arrêt a été court, sinon repartie de maintenant
+            self.sessions[(guild_id, user_id)] = start if start and now - start <= RECOVERY_WINDOW else now
+        self.recovered = True
+        self.flush()
+
+    def flush(self):
+        now = time.time()
+        for key, start in self.sessions.items():
+            self.pending[key] = self.pending.get(key, 0) + now - start
+            self.sessions[key] = now
+        # Seules les lignes des serveurs touchés sont resérialisées
+        dirty = set()
+        for (guild_id, user_id), seconds in self.pending.items():
+            whole = int(seconds)
+            if whole:
+                dirty.add(self.totals.key(guild_id))
+                totals = self.totals(guild_id)
+                totals[user_id] = totals.get(user_id, 0) + whole
+                self.index(self.totals, guild_id).set(user_id, totals[user_id])
+            self.pending[(guild_id, user_id)] = seconds - whole
+        self.pending = {key: s for key, s in self.pending.items() if s}
+        for (guild_id, user_id), gained in self.xp_pending.items():
+            dirty.add(self.xp.key(guild_id))
+            xp = self.xp(guild_id)
+            xp[user_id] = xp.get(user_id, 0) + gained
+            self.index(self.xp, guild_id).set(user_id, xp[user_id])
+        self.xp_pending.clear()
+        for guild_id, saved in self.saved_sessions.items():
+            if saved:
+                dirty.add(self.saved_sessions.key(guild_id))
+                saved.clear()
+        for (guild_id, user_id), start in self.sessions.items():
+            dirty.add(self.saved_sessions.key(guild_id))
+            self.saved_sessions(guild_id)[user_id] = start
+        if dirty:
+            save_data(self.data, *dirty)
+
+    @tasks.loop(minutes=FLUSH_MINUTES)
+    async def flush_loop(self):
+        if self.recovered:
+            self.flush()
+
+    @commands.command(name="vocal")
+    async def vocal(self, ctx, member: discord.Member = None):
+        member = member or ctx.author
+        user_id = str(member.id)
+        key = (ctx.guild.id, user_id)
+        index = self.index(self.totals, ctx.guild.id)
+        total = index.get(user_id) + self.pending.get(key, 0)
+        if key in self.sessions:
+            total += time.time() - self.sessions[key]
+        rank = index.rank(user_id)
+        rank_text = f"#{rank}/{len(index)}" if rank else "non classé"
+        await ctx.send(f"🎙️ {member.display_name} : {format_duration(total)} en vocal ({rank_text})")
+
+    @commands.command(name="topvocal")
+    async def topvocal(self, ctx):
+        top = self.index(self.totals, ctx.guild.id).top(10)
+        if not top:
+            return await ctx.send("Personne n'a encore de temps vocal.")
+        lines = []
+        for pos, (user_id, seconds) in enumerate(top, 1):
+            member = ctx.guild.get_member(int(user_id))
+            name = member.display_name if member else f"<@{user_id}>"
+            lines.append(f"{pos}. {name} — {format_duration(seconds)}")
+        await ctx.send("🏆 **Classement vocal**\n" + "\n".join(lines))
+
+    @commands.command(name="rank")
+    async def rank(self, ctx, member: discord.Member = None):
+        member = member or ctx.author
+        user_id = str(member.id)
+        index = self.index(self.xp, ctx.guild.id)
+        xp = index.get(user_id) + self.xp_pending.get((ctx.guild.id, user_id), 0)
+        level, into, needed = level_from_xp(xp)
+        rank = index.rank(user_id)
+        rank_text = f"#{rank}/{len(index)}" if rank else "non classé"
+        await ctx.send(f"⭐ {member.display_name} : niveau {level} ({into}/{needed} XP), {xp} XP au total ({rank_text})")
+
+    @commands.command(name="top")
+    async def top(self, ctx):
+        top = self.index(self.xp, ctx.guild.id).top(10)
+        if not top:
+            return await ctx.send("Personne n'a encore d'XP.")
+        lines = []
+        for pos, (user_id, xp) in enumerate(top, 1):
+            member = ctx.guild.get_member(int(user_id))
+            name = member.display_name if member else f"<@{user_id}>"
+            lines.append(f"{pos}. {name} — niveau {level_from_xp(xp)[0]} ({xp} XP)")
+        await ctx.send("🏆 **Classement XP**\n" + "\n".join(lines))
+
+async def setup(bot):
+    await bot.add_cog(Levels(bot))
\ No newline at end of file
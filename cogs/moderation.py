@@ -1,13 +1,79 @@
+import re
+
+import discord
 from discord.ext import commands
 
+from purge import PurgeFilter, PurgeJob
+
+# !clear 500 user: @membre regex: https?:// pj: on
+# Une purge à la fois par salon ; !clear stop l'interrompt. Pas de plafond :
+# la mémoire reste constante, quel que soit le nombre de messages.
+
+
+class ClearFlags(commands.FlagConverter):
+    user: discord.Member = None
+    regex: str = None
+    pj: bool = False
+
+
 class Moderation(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.jobs = {}  # channel_id -> PurgeJob en cours
+
+    async def cog_unload(self):
+        for job in self.jobs.values():
+            job.cancel()
+
+    @commands.group(invoke_without_command=True)
+    @commands.has_permissions(manage_messages=True)
+    async def clear(self, ctx, amount: int = 5, *, flags: ClearFlags = None):
+        if ctx.channel.id in self.jobs:
+            return await ctx.send("⏳ Une purge est déjà en cours ici (`clear stop` pour l'arrêter).", delete_after=5)
+        if amount < 1:
+            return await ctx.send("❌ Indique un nombre de messages positif.", delete_after=5)
+        try:
+            check = PurgeFilter(
+                user_id=flags.user.id if flags and flags.user else None,
+                pattern=flags.regex if flags else None,
+                attachments=flags.pj if flags else False
+            )
+        except re.error as e:
+            return await ctx.send(f"❌ Expression invalide : {e}", delete_after=5)
+        # Le message de commande est retiré à part : il n'entre pas dans le compte
+        try:
+            await ctx.message.delete()
+        except discord.HTTPException:
+            pass
+        job = PurgeJob(ctx.channel, amount, check, before=ctx.message)
+        described = check.describe()
+        status = await ctx.send(f"🧹 Purge de {amount} messages" + (f" {described}" if described else "") + "…")
+
+        async def progress(job):
+            try:
+                await status.edit(content=job.summary())
+            except discord.NotFound:
+                pass
+
+        self.jobs[ctx.channel.id] = job
+        try:
+            await job.run(progress)
+        finally:
+            del self.jobs[ctx.channel.id]
+        try:
+            await status.edit(content=job.summary(), delete_after=10)
+        except discord.NotFound:
+            pass
+
+    @clear.command(name="stop")
+    @commands.has_permissions(manage_messages=True)
+    async def clear_stop(self, ctx):
+        job = self.jobs.get(ctx.channel.id)
+        if job is None:
+            return await ctx.send("Aucune purge en cours dans ce salon.", delete_after=5)
+        job.cancel()
+        await ctx.send("🛑 Purge interrompue.", delete_after=5)
 
-    @commands.command()
-    async def clear(self, ctx, amount: int = 5):
-        await ctx.channel.purge(limit=amount)
-        await ctx.send(f"{amount} messages supprimés", delete_after=3)
 
-def setup(bot):
-    bot.add_cog(Moderation(bot))
\ No newline at end of file
+async def setup(bot):
+    await bot.add_cog(Moderation(bot))
@@ -1,4 +1,5 @@
 from discord.ext import commands
+import discord
 
 class Roles(commands.Cog):
     def __init__(self, bot):
@@ -13,5 +14,5 @@ class Roles(commands.Cog):
         else:
             await ctx.send("Rôle introuvable.")
 
-def setup(bot):
-    bot.add_cog(Roles(bot))
\ No newline at end of file
+async def setup(bot):
+    await bot.add_cog(Roles(bot))
\ No newline at end of file
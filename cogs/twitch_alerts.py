@@ -1,45 +1,48 @@
 from discord.ext import tasks, commands
-import os
-import requests
+
+from alerts import broadcast
+from ratelimit import twitch_limiter
+from settings import settings
+from storage import load_data, save_data
+
+# Annonce des lives Twitch par sondage Helix. Le sondage passe par le
+# TwitchMonitor partagé (bot.twitch_monitor, créé par main.py) : un seul
+# poller, un seul token d'application en cache, et le même état
+# data["twitch_live"] que les notifications EventSub, pour qu'un live ne soit
+# jamais annoncé deux fois. Tout est asynchrone (aiohttp via httpclient).
+
 
 class TwitchAlerts(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.data = load_data()
         self.check_live_status.start()
-        self.is_live = False
-
-    def get_headers(self):
-        return {
-            "Client-ID": os.getenv("TWITCH_CLIENT_ID"),
-            "Authorization": f"Bearer {self.get_access_token()}"
-        }
-
-    def get_access_token(self):
-        url = "https://id.twitch.tv/oauth2/token"
-        params = {
-            "client_id": os.getenv("TWITCH_CLIENT_ID"),
-            "client_secret": os.getenv("TWITCH_SECRET"),
-            "grant_type": "client_credentials"
-        }
-        response = requests.post(url, params=params)
-        return response.json()["access_token"]
+
+    def cog_unload(self):
+        self.check_live_status.cancel()
 
     @tasks.loop(minutes=1)
     async def check_live_status(self):
-        streamer = os.getenv("STREAMER_NAME")
-        channel_id = int(os.getenv("ALERT_CHANNEL_ID"))
-        url = f"https://api.twitch.tv/helix/streams?user_login={streamer}"
-        response = requests.get(url, headers=self.get_headers())
-
-        data = response.json().get("data", [])
-        channel = self.bot.get_channel(channel_id)
-
-        if data and not self.is_live:
-            await channel.send(f"🔴 **{streamer} est en live !**
-https://twitch.tv/{streamer}")
-            self.is_live = True
-        elif not data:
-            self.is_live = False
-
-def setup(bot):
-    bot.add_cog(TwitchAlerts(bot))
\ No newline at end of file
+        monitor = getattr(self.bot, "twitch_monitor", None)
+        if not monitor or not settings.common.twitch_polling:
+            return
+        went_live, went_offline = await monitor.poll()
+        for stream in went_live:
+            login = stream.get("user_login")
+            await broadcast(
+                self.bot, "twitch_alert_channel_id",
+                f"🔴 {login} est en live : **{stream.get('title', '')}** https://twitch.tv/{login}"
+            )
+        if went_live or went_offline:
+            save_data(self.data, "twitch_live")
+        # Intervalle ajusté au quota Helix restant et au nombre de paquets de logins
+        self.check_live_status.change_interval(seconds=twitch_limiter.pace(60, monitor.batches))
+
+    @check_live_status.before_loop
+    async def before_check(self):
+        # Une transition vue avant la connexion serait perdue (aucun salon en cache)
+        await self.bot.wait_until_ready()
+
+
+async def setup(bot):
+    await bot.add_cog(TwitchAlerts(bot))
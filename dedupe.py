@@ -0,0 +1,48 @@
+from collections import deque
+
+# --- Déduplication des tweets postés ---
+# Les ids Twitter sont des snowflakes croissants : on garde le plus grand id
+# posté (high-water mark, comparé en entier et non en chaîne) et un petit
+# ensemble borné des derniers ids, au lieu d'une liste qui grossit à l'infini.
+# Persisté dans `state` sous la forme {"high_water": "…", "recent": ["…", …]}.
+
+RECENT_SIZE = 100
+
+
+class SnowflakeDedupe:
+    def __init__(self, state: dict, max_recent=RECENT_SIZE):
+        self.state = state
+        self.high_water = int(state.get("high_water") or 0)
+        self._order = deque((int(i) for i in state.get("recent", [])), maxlen=max_recent)
+        self._recent = set(self._order)
+
+    @classmethod
+    def from_data(cls, data: dict, key="twitter_dedupe", legacy_key="twitter_posted_tweets"):
+        state = data.setdefault(key, {})
+        legacy = data.pop(legacy_key, None)
+        dedupe = cls(state)
+        if legacy:
+            # Migration de l'ancienne liste complète des ids postés
+            for tweet_id in sorted(int(i) for i in legacy):
+                dedupe.add(tweet_id)
+        return dedupe
+
+    @property
+    def since_id(self):
+        return str(self.high_water) if self.high_water else None
+
+    def is_new(self, tweet_id) -> bool:
+        tweet_id = int(tweet_id)
+        return tweet_id > self.high_water and tweet_id not in self._recent
+
+    def add(self, tweet_id):
+        tweet_id = int(tweet_id)
+        if tweet_id in self._recent:
+            return
+        if len(self._order) == self._order.maxlen:
+            self._recent.discard(self._order[0])
+        self._order.append(tweet_id)
+        self._recent.add(tweet_id)
+        self.high_water = max(self.high_water, tweet_id)
+        self.state["high_water"] = str(self.high_water)
+        self.state["recent"] = [str(i) for i in self._order]
@@ -0,0 +1,172 @@
+import time
+import heapq
+import asyncio
+import logging
+
+import discord
+
+# --- Cycle de vie des salons vocaux éphémères ---
+# Salons temporaires (cog TempVC) et salons de squad passent tous par ce
+# gestionnaire. Il est piloté par on_voice_state_update : quand un salon suivi
+# se vide, une suppression est programmée après un délai de grâce dans un tas
+# de deadlines ; si quelqu'un revient avant, elle est annulée. Une seule tâche
+# dort jusqu'à la prochaine deadline, quel que soit le nombre de salons.
+# `states` donne, pour chaque serveur, le dict persisté "ephemeral_vcs" :
+# {vc_id: type}, persisté par `save(guild_id)`. Les salons suivis sont indexés en mémoire par id pour ne pas
+# avoir à parcourir les serveurs à chaque événement vocal.
+
+DEFAULT_GRACE = 60
+
+
+def humans(channel):
+    return [m for m in channel.members if not m.bot]
+
+
+class EphemeralVoiceManager:
+    def __init__(self, bot, states, save=None):
+        self.bot = bot
+        self.states = states
+        self.save = save or (lambda guild_id: None)
+        self.kinds = {}       # type -> (délai de grâce, handler d'expiration)
+        self.tracked = {}     # vc_id -> (guild_id, type)
+        self._deadlines = {}  # vc_id -> deadline (monotonic)
+        self._heap = []       # (deadline, vc_id), entrées périmées ignorées
+        self._wake = None
+        self._task = None
+        self.reconciled = False
+        self.load()
+
+    def register(self, kind, grace=DEFAULT_GRACE, handler=None):
+        # handler(vc_id) : coroutine appelée à l'expiration, suppression du salon par défaut
+        self.kinds[kind] = (grace, handler)
+
+    def __contains__(self, vc_id):
+        return vc_id in self.tracked
+
+    def load(self):
+        self.tracked = {
+            int(key): (guild_id, kind)
+            for guild_id, state in self.states.items()
+            for key, kind in state.items()
+        }
+
+    def track(self, channel, kind):
+        self.tracked[channel.id] = (channel.guild.id, kind)
+        self.states(channel.guild.id)[str(channel.id)] = kind
+        self.save(channel.guild.id)
+        if not humans(channel):
+            self.schedule(channel.id)
+
+    def untrack(self, vc_id):
+        self._deadlines.pop(vc_id, None)
+        entry = self.tracked.pop(vc_id, None)
+        if entry is not None:
+            self.states(entry[0]).pop(str(vc_id), None)
+            self.save(entry[0])
+
+    def kind(self, vc_id):
+        entry = self.tracked.get(vc_id)
+        return entry[1] if entry else None
+
+    # --- Deadlines ---
+    def schedule(self, vc_id):
+        kind = self.kind(vc_id)
+        grace = self.kinds.get(kind, (DEFAULT_GRACE, None))[0]
+        deadline = time.monotonic() + grace
+        self._deadlines[vc_id] = deadline
+        heapq.heappush(self._heap, (deadline, vc_id))
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        elif self._heap[0][1] == vc_id:
+            self._wake.set()
+
+    def cancel(self, vc_id):
+        self._deadlines.pop(vc_id, None)
+
+    def on_voice_state_update(self, member, before, after):
+        if before.channel == after.channel:
+            return
+        if after.channel and after.channel.id in self._deadlines:
+            self.cancel(after.channel.id)
+        if before.channel and before.channel.id in self.tracked and not humans(before.channel):
+            self.schedule(before.channel.id)
+
+    async def _run(self):
+        while self._deadlines:
+            while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                break
+            deadline, vc_id = self._heap[0]
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            del self._deadlines[vc_id]
+            await self._expire(vc_id)
+
+    async def _expire(self, vc_id):
+        channel = self.bot.get_channel(vc_id)
+        if channel is not None and humans(channel):
+            return
+        kind = self.kind(vc_id)
+        handler = self.kinds.get(kind, (None, None))[1]
+        self.untrack(vc_id)
+        try:
+            if handler:
+                await handler(vc_id)
+            elif channel is not None:
+                await channel.delete()
+        except discord.NotFound:
+            pass
+        except Exception as e:
+            logging.error(f"Suppression du salon éphémère {vc_id} impossible : {e}")
+
+    # --- Démarrage ---
+    async def reconcile(self, categories=(), orphan_kind="temp"):
+        # Une seule passe au démarrage : oublie les salons disparus, programme
+        # les salons vides et adopte les salons inconnus des catégories gérées.
+        # Les serveurs d'autres processus (shards répartis) ne sont pas touchés.
+        self.load()
+        for vc_id, (guild_id, kind) in list(self.tracked.items()):
+            if self.bot.get_guild(guild_id) is None:
+                continue
+            channel = self.bot.get_channel(vc_id)
+            if channel is None:
+                self.untrack(vc_id)
+            elif not humans(channel):
+                self.schedule(channel.id)
+        for category in categories:
+            if category is None:
+                continue
+            for channel in category.voice_channels:
+                if channel.id not in self.tracked:
+                    self.track(channel, orphan_kind)
+        self.reconciled = True
+
+    def sweep(self):
+        # Après une reconnexion sans reprise de session : les départs pendant la
+        # coupure n'ont produit aucun événement vocal. Les salons suivis sont
+        # revus depuis le cache (sans appel API) : vides ou disparus, ils sont
+        # programmés ; réoccupés, leur suppression est annulée.
+        scheduled = 0
+        for vc_id, (guild_id, kind) in list(self.tracked.items()):
+            if self.bot.get_guild(guild_id) is None:
+                continue
+            channel = self.bot.get_channel(vc_id)
+            if channel is not None and humans(channel):
+                self.cancel(vc_id)
+            elif vc_id not in self._deadlines:
+                self.schedule(vc_id)
+                scheduled += 1
+        return scheduled
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
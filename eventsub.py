@@ -0,0 +1,110 @@
+import hmac
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+# --- Réception des webhooks Twitch EventSub ---
+# Vérifie la signature HMAC de chaque message, répond au challenge de
+# vérification, ignore les rejeux (id de message déjà vu ou trop ancien)
+# puis délègue les notifications aux handlers enregistrés par type.
+
+HEADER_ID = "Twitch-Eventsub-Message-Id"
+HEADER_TIMESTAMP = "Twitch-Eventsub-Message-Timestamp"
+HEADER_SIGNATURE = "Twitch-Eventsub-Message-Signature"
+HEADER_TYPE = "Twitch-Eventsub-Message-Type"
+MAX_MESSAGE_AGE = 600  # Twitch recommande de rejeter au-delà de 10 minutes
+
+
+def sign(secret: str, message_id: str, timestamp: str, body: bytes) -> str:
+    mac = hmac.new(secret.encode(), message_id.encode() + timestamp.encode() + body, hashlib.sha256)
+    return f"sha256={mac.hexdigest()}"
+
+
+def parse_timestamp(value: str) -> float:
+    # RFC3339 avec nanosecondes : on tronque aux microsecondes pour fromisoformat
+    value = value.rstrip("Z")
+    if "." in value:
+        head, frac = value.split(".", 1)
+        value = f"{head}.{frac[:6]}"
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+
+class ReplayCache:
+    def __init__(self, max_size=2000, ttl=MAX_MESSAGE_AGE):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._seen = OrderedDict()  # message_id -> instant de réception
+
+    def seen(self, message_id: str) -> bool:
+        now = time.monotonic()
+        while self._seen:
+            oldest, ts = next(iter(self._seen.items()))
+            if now - ts < self.ttl and len(self._seen) < self.max_size:
+                break
+            self._seen.popitem(last=False)
+        if message_id in self._seen:
+            return True
+        self._seen[message_id] = now
+        return False
+
+
+class EventSubHandler:
+    def __init__(self, secret: str, cache_size=2000):
+        self.secret = secret
+        self.replays = ReplayCache(cache_size)
+        self.handlers = {}
+        self._tasks = set()
+
+    def on(self, sub_type: str):
+        def decorator(func):
+            self.handlers[sub_type] = func
+            return func
+        return decorator
+
+    async def __call__(self, request: web.Request):
+        body = await request.read()
+        message_id = request.headers.get(HEADER_ID, "")
+        timestamp = request.headers.get(HEADER_TIMESTAMP, "")
+        signature = request.headers.get(HEADER_SIGNATURE, "")
+        if not self.secret:
+            return web.Response(status=403, text="Webhook disabled")
+        expected = sign(self.secret, message_id, timestamp, body)
+        if not message_id or not hmac.compare_digest(expected, signature):
+            return web.Response(status=403, text="Bad signature")
+        try:
+            if time.time() - parse_timestamp(timestamp) > MAX_MESSAGE_AGE:
+                return web.Response(status=403, text="Message expired")
+            payload = json.loads(body)
+        except ValueError as e:
+            return web.Response(status=400, text=str(e))
+
+        msg_type = request.headers.get(HEADER_TYPE)
+        if msg_type == "webhook_callback_verification":
+            return web.Response(text=payload.get("challenge", ""), content_type="text/plain")
+        if self.replays.seen(message_id):
+            return web.Response(status=204)
+        sub_type = payload.get("subscription", {}).get("type")
+        if msg_type == "revocation":
+            logging.warning(f"Abonnement EventSub révoqué : {sub_type} ({payload['subscription'].get('status')})")
+        elif msg_type == "notification":
+            handler = self.handlers.get(sub_type)
+            if handler:
+                # Twitch attend une réponse 2xx rapide : le traitement part en tâche de fond
+                task = asyncio.create_task(self._dispatch(handler, sub_type, payload.get("event", {})))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            else:
+                logging.info(f"Événement EventSub ignoré : {sub_type}")
+        return web.Response(status=204)
+
+    async def _dispatch(self, handler, sub_type, event):
+        try:
+            await handler(event)
+        except Exception as e:
+            logging.error(f"Erreur dans le handler EventSub {sub_type} : {e}")
@@ -0,0 +1,136 @@
+import heapq
+import random
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+import discord
+
+# --- Moteur de giveaways ---
+# Un tas des dates de fin permet de dormir exactement jusqu'au prochain
+# tirage. Les participants (réaction 🎉) sont parcourus page par page et le
+# gagnant est choisi par échantillonnage de réservoir : mémoire constante
+# même avec des dizaines de milliers de participants. La progression du
+# tirage est persistée à chaque page pour reprendre après un redémarrage.
+# `states` donne, pour chaque serveur, le dict persisté "giveaways" :
+#   {gid: {"channel_id", "message_id", "prize", "end_time",
+#          "draw": {"after": id, "seen": n, "winner_id": id}}}
+# `save(guild_id)` persiste l'état d'un serveur.
+
+UTC = timezone.utc
+GIVEAWAY_EMOJI = "🎉"
+PAGE_SIZE = 100
+
+
+class GiveawayEngine:
+    def __init__(self, bot, states, save=None):
+        self.bot = bot
+        self.states = states
+        self.save = save or (lambda guild_id: None)
+        self._heap = []
+        self._wake = None
+        self._task = None
+
+    def start(self):
+        # Idempotent : relancé sans effet à chaque on_ready
+        if self._task and not self._task.done():
+            return
+        # Seuls les giveaways des serveurs de ce processus sont tirés ici
+        self._heap = [
+            (self._deadline(g), gid, guild_id)
+            for guild_id, state in self.states.items() if self.bot.get_guild(guild_id)
+            for gid, g in state.items()
+        ]
+        heapq.heapify(self._heap)
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    @staticmethod
+    def _deadline(g):
+        end = datetime.fromisoformat(g["end_time"])
+        if end.tzinfo is None:
+            end = end.replace(tzinfo=UTC)
+        return end.timestamp()
+
+    def add(self, guild_id, gid, channel_id, message_id, prize, end_time: datetime):
+        g = {
+            "channel_id": channel_id,
+            "message_id": message_id,
+            "prize": prize,
+            "end_time": end_time.isoformat()
+        }
+        self.states(guild_id)[str(gid)] = g
+        self.save(guild_id)
+        heapq.heappush(self._heap, (self._deadline(g), str(gid), guild_id))
+        if self._wake and self._heap[0][1] == str(gid):
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            deadline, gid, guild_id = self._heap[0]
+            delay = deadline - datetime.now(UTC).timestamp()
+            if delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            if gid not in self.states(guild_id):
+                continue
+            try:
+                await self.draw(guild_id, gid)
+            except discord.HTTPException as e:
+                # Erreur Discord passagère : nouvel essai dans une minute, la progression est gardée
+                logging.warning(f"Tirage du giveaway {gid} interrompu : {e}")
+                heapq.heappush(self._heap, (datetime.now(UTC).timestamp() + 60, gid, guild_id))
+
+    async def draw(self, guild_id, gid):
+        state = self.states(guild_id)
+        g = state[gid]
+        ch = self.bot.get_channel(g.get("channel_id", 0))
+        if ch is None:
+            state.pop(gid, None)
+            self.save(guild_id)
+            return
+        try:
+            msg = await ch.fetch_message(g.get("message_id", 0))
+        except discord.NotFound:
+            state.pop(gid, None)
+            self.save(guild_id)
+            return
+        reaction = discord.utils.get(msg.reactions, emoji=GIVEAWAY_EMOJI)
+        progress = g.setdefault("draw", {"after": None, "seen": 0, "winner_id": None})
+        if reaction:
+            await self._sample(guild_id, reaction, progress)
+        winner_id = progress.get("winner_id")
+        if winner_id:
+            await ch.send(f"🎊 <@{winner_id}> a gagné {g.get('prize', '')}")
+        else:
+            await ch.send("Personne...")
+        state.pop(gid, None)
+        self.save(guild_id)
+
+    async def _sample(self, guild_id, reaction, progress):
+        # Réservoir de taille 1 : le n-ième participant remplace le gagnant avec une proba 1/n
+        after = discord.Object(progress["after"]) if progress.get("after") else None
+        count = 0
+        async for user in reaction.users(limit=None, after=after):
+            progress["after"] = user.id
+            if not user.bot:
+                progress["seen"] += 1
+                if random.randrange(progress["seen"]) == 0:
+                    progress["winner_id"] = user.id
+            count += 1
+            if count % PAGE_SIZE == 0:
+                self.save(guild_id)
+        self.save(guild_id)
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
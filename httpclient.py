@@ -0,0 +1,87 @@
+import os
+import asyncio
+import logging
+
+import aiohttp
+
+from ratelimit import PRIORITY_NORMAL
+
+# --- Client HTTP partagé ---
+# Une seule ClientSession pour toutes les API (Twitter, Twitch Helix, OAuth) :
+# les connexions TLS sont réutilisées (keep-alive) au lieu d'un handshake
+# par requête, et aucune session n'est oubliée ouverte.
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 15))
+HTTP_LIMIT = int(os.getenv("HTTP_LIMIT", 100))
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", 10))
+
+
+class HttpClient:
+    def __init__(self, limit=HTTP_LIMIT, limit_per_host=HTTP_LIMIT_PER_HOST,
+                 dns_ttl=300, keepalive=30, timeout=HTTP_TIMEOUT):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive = keepalive
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=min(timeout, 10))
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Création paresseuse : la session doit naître dans la boucle asyncio
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+    async def request_json(self, method, url, limiter=None, priority=PRIORITY_NORMAL, retries=3, **kwargs):
+        # Passe par l'ordonnanceur de l'API : attente de budget, mise à jour du
+        # quota depuis les en-têtes et nouvel essai après backoff sur 429 (sans récursion).
+        status, body = 0, None
+        for _ in range(retries + 1):
+            if limiter:
+                await limiter.acquire(priority)
+            async with self.request(method, url, **kwargs) as resp:
+                status = resp.status
+                if limiter:
+                    limiter.update(resp.headers)
+                if status != 429:
+                    if limiter:
+                        limiter.success()
+                    # Corps lu seulement en 2xx : une page d'erreur HTML (503...) n'est pas du JSON
+                    body = None
+                    if 200 <= status < 300 and resp.content_length != 0:
+                        try:
+                            body = await resp.json(content_type=None)
+                        except ValueError:
+                            logging.warning(f"Réponse non JSON de {url} ({status})")
+                    return status, body
+                if limiter:
+                    limiter.backoff(resp.headers)
+            if not limiter:
+                await asyncio.sleep(1)
+        return status, body
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            # Laisse le temps aux connexions SSL de se fermer proprement
+            await asyncio.sleep(0.25)
+        self._session = None
+
+
+http_client = HttpClient()
@@ -0,0 +1,88 @@
+import time
+import logging
+
+import discord
+
+# --- Routeur d'interactions ---
+# Les custom_id sont structurés "domaine:action[:argument...]" (ex.
+# "squad:join:123"). Le préfixe le plus long enregistré est retrouvé par
+# quelques recherches dans un dict, quel que soit le nombre de boutons actifs ;
+# le reste de l'id est passé au handler. Les handlers marqués `defer`
+# (appels REST lents) sont différés avant d'être exécutés, pour tenir dans
+# la fenêtre de 3 s de Discord, et répondent ensuite via `reply`.
+# La latence de chaque handler est mesurée.
+
+SLOW_WARNING_MS = 2500
+
+
+async def reply(interaction: discord.Interaction, content=None, **kwargs):
+    # Réponse initiale, ou suivi si l'interaction a déjà été différée
+    kwargs.setdefault("ephemeral", True)
+    if interaction.response.is_done():
+        return await interaction.followup.send(content, **kwargs)
+    return await interaction.response.send_message(content, **kwargs)
+
+
+class InteractionRouter:
+    def __init__(self):
+        self.routes = {}  # préfixe -> (handler, defer, ephemeral)
+        self.stats = {}   # préfixe -> {"calls", "errors", "total_ms", "max_ms"}
+        self._depth = 1
+
+    def route(self, prefix, defer=False, ephemeral=True):
+        # handler(interaction, *arguments) ; arguments = segments après le préfixe
+        def decorator(handler):
+            self.routes[prefix] = (handler, defer, ephemeral)
+            self.stats[prefix] = {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+            self._depth = max(self._depth, prefix.count(":") + 1)
+            return handler
+        return decorator
+
+    def resolve(self, custom_id):
+        parts = custom_id.split(":", self._depth)
+        for n in range(min(len(parts), self._depth), 0, -1):
+            prefix = ":".join(parts[:n])
+            if prefix in self.routes:
+                rest = ":".join(parts[n:])
+                return prefix, rest.split(":") if rest else []
+        return None, []
+
+    async def dispatch(self, interaction: discord.Interaction):
+        # Renvoie True si l'interaction a été prise en charge
+        if interaction.type != discord.InteractionType.component:
+            return False
+        prefix, args = self.resolve(interaction.data.get("custom_id", ""))
+        if prefix is None:
+            return False
+        handler, defer, ephemeral = self.routes[prefix]
+        st = self.stats[prefix]
+        started = time.perf_counter()
+        try:
+            if defer:
+                await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+            await handler(interaction, *args)
+        except Exception as e:
+            st["errors"] += 1
+            logging.error(f"Interaction {prefix} en échec : {e}")
+            try:
+                await reply(interaction, "❌ Une erreur est survenue.")
+            except discord.HTTPException:
+                pass
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            st["calls"] += 1
+            st["total_ms"] += elapsed
+            st["max_ms"] = max(st["max_ms"], elapsed)
+            if elapsed > SLOW_WARNING_MS and not defer:
+                logging.warning(f"Interaction {prefix} lente ({elapsed:.0f} ms) : la marquer defer=True")
+        return True
+
+    def report(self):
+        lines = []
+        for prefix, st in sorted(self.stats.items()):
+            avg = st["total_ms"] / st["calls"] if st["calls"] else 0.0
+            lines.append(
+                f"🔘 `{prefix}` : {st['calls']} appels, {avg:.0f} ms moy. / {st['max_ms']:.0f} ms max"
+                + (f", {st['errors']} erreurs" if st["errors"] else "")
+            )
+        return lines
@@ -0,0 +1,224 @@
+import hmac
+import time
+import base64
+import hashlib
+import logging
+import secrets
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+import discord
+
+from httpclient import http_client
+from ratelimit import PRIORITY_HIGH, PRIORITY_LOW, twitch_limiter
+
+# --- Liaison des comptes Discord ↔ Twitch ---
+# Le paramètre OAuth `state` est un jeton signé (HMAC) qui lie le clic à un
+# membre et à un serveur, expire après STATE_TTL secondes et n'est utilisable
+# qu'une fois : son nonce est gardé, avec son expiration, dans un dict borné
+# persisté (data["link_states"]) et retiré à la consommation. Avec un secret
+# fixe (LINK_STATE_SECRET), les liens en cours survivent donc à un redémarrage.
+# La liaison est persistée dans data["linked_accounts"] :
+#   {discord_id: {"twitch_id", "login", "linked_at"}}
+# Les membres sont pris dans le cache gateway, REST seulement en dernier
+# recours, et le rôle n'est ajouté que s'il manque. resync() recale un
+# serveur entier sur le rôle follower à partir de lookups Helix par 100.
+
+UTC = timezone.utc
+AUTHORIZE_URL = "https://id.twitch.tv/oauth2/authorize"
+TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+HELIX_USERS_URL = "https://api.twitch.tv/helix/users"
+HELIX_BATCH = 100
+STATE_TTL = 600
+MAX_PENDING = 10000
+
+
+class LinkError(Exception):
+    pass
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+class StateTokens:
+    def __init__(self, secret: bytes, pending: dict = None, save=None, ttl=STATE_TTL, max_pending=MAX_PENDING):
+        self.secret = secret
+        self.ttl = ttl
+        self.max_pending = max_pending
+        # nonce -> expiration, dans l'ordre d'émission (conservé par JSON)
+        self._pending = {} if pending is None else pending
+        self.save = save or (lambda: None)
+
+    def _sign(self, payload: str) -> str:
+        return _b64(hmac.new(self.secret, payload.encode(), hashlib.sha256).digest()[:18])
+
+    def _purge(self, now):
+        while self._pending:
+            nonce, expires = next(iter(self._pending.items()))
+            if expires > now and len(self._pending) <= self.max_pending:
+                break
+            del self._pending[nonce]
+
+    def issue(self, user_id, guild_id, now=None):
+        now = time.time() if now is None else now
+        nonce = _b64(secrets.token_bytes(12))
+        expires = int(now + self.ttl)
+        self._pending[nonce] = expires
+        self._purge(now)
+        self.save()
+        payload = f"{nonce}.{user_id}.{guild_id}.{expires}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def consume(self, token: str, now=None):
+        # Renvoie (user_id, guild_id), ou lève LinkError
+        now = time.time() if now is None else now
+        try:
+            nonce, user_id, guild_id, expires, sig = token.split(".")
+            user_id, guild_id, expires = int(user_id), int(guild_id), int(expires)
+        except ValueError:
+            raise LinkError("state mal formé")
+        if not hmac.compare_digest(sig, self._sign(f"{nonce}.{user_id}.{guild_id}.{expires}")):
+            raise LinkError("signature invalide")
+        if expires < now:
+            raise LinkError("lien expiré")
+        if self._pending.pop(nonce, None) is None:
+            raise LinkError("lien déjà utilisé ou inconnu")
+        self.save()
+        return user_id, guild_id
+
+    def __len__(self):
+        return len(self._pending)
+
+
+class TwitchLinker:
+    def __init__(self, bot, accounts: dict, client_id, client_secret, redirect_uri, app_token,
+                 role_id=lambda guild_id: 0, secret: bytes = None, pending: dict = None,
+                 save=None, save_pending=None):
+        self.bot = bot
+        self.accounts = accounts
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.app_token = app_token
+        self.role_id = role_id
+        # Sans secret configuré, les liens en cours sont invalidés au redémarrage
+        self.states = StateTokens(secret or secrets.token_bytes(32), pending, save_pending)
+        self.save = save or (lambda: None)
+        self.stats = {"linked": 0, "refused": 0, "rest_members": 0}
+
+    def authorize_url(self, member: discord.Member):
+        state = self.states.issue(member.id, member.guild.id)
+        q = urlencode({"client_id": self.client_id, "redirect_uri": self.redirect_uri,
+                       "response_type": "code", "scope": "user:read:email", "state": state})
+        return f"{AUTHORIZE_URL}?{q}"
+
+    async def resolve_member(self, guild: discord.Guild, user_id: int):
+        member = guild.get_member(user_id)
+        if member is None:
+            self.stats["rest_members"] += 1
+            try:
+                member = await guild.fetch_member(user_id)
+            except discord.NotFound:
+                return None
+        return member
+
+    async def grant(self, member: discord.Member):
+        role = member.guild.get_role(self.role_id(member.guild.id))
+        if role is None or role in member.roles:
+            return False
+        await member.add_roles(role, reason="Compte Twitch lié")
+        return True
+
+    async def _exchange(self, code):
+        status, body = await http_client.request_json(
+            "POST", TOKEN_URL, data={
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "code": code,
+                "grant_type": "authorization_code",
+                "redirect_uri": self.redirect_uri
+            }
+        )
+        if status != 200 or not body or not body.get("access_token"):
+            raise LinkError(f"échange du code refusé ({status})")
+        status, body = await http_client.request_json(
+            "GET", HELIX_USERS_URL, limiter=twitch_limiter, priority=PRIORITY_HIGH,
+            headers={"Authorization": f"Bearer {body['access_token']}", "Client-Id": self.client_id}
+        )
+        users = (body or {}).get("data") or []
+        if status != 200 or not users:
+            raise LinkError(f"utilisateur Twitch introuvable ({status})")
+        return users[0]["id"], users[0]["login"]
+
+    async def complete(self, code, state):
+        # Callback OAuth : renvoie le login Twitch lié, ou lève LinkError
+        try:
+            user_id, guild_id = self.states.consume(state)
+            twitch_id, login = await self._exchange(code)
+        except LinkError:
+            self.stats["refused"] += 1
+            raise
+        self.accounts[str(user_id)] = {
+            "twitch_id": twitch_id,
+            "login": login,
+            "linked_at": datetime.now(UTC).isoformat()
+        }
+        self.save()
+        self.stats["linked"] += 1
+        # Rôle sur le serveur d'origine (REST si le membre n'est pas en cache),
+        # puis sur nos autres serveurs où le membre est en cache
+        for guild in self.bot.guilds:
+            if guild.id == guild_id:
+                member = await self.resolve_member(guild, user_id)
+            else:
+                member = guild.get_member(user_id)
+            if member is None:
+                continue
+            try:
+                await self.grant(member)
+            except discord.HTTPException as e:
+                logging.warning(f"Rôle Twitch non donné à {user_id} sur {guild.id} : {e}")
+        return login
+
+    async def _lookup(self, twitch_ids):
+        # {twitch_id: login} des comptes renvoyés par Helix (sans les suspendus), 100 ids par requête
+        found = {}
+        for i in range(0, len(twitch_ids), HELIX_BATCH):
+            params = [("id", t) for t in twitch_ids[i:i + HELIX_BATCH]]
+            status, body = await http_client.request_json(
+                "GET", HELIX_USERS_URL, limiter=twitch_limiter, priority=PRIORITY_LOW,
+                headers=await self.app_token.headers(), params=params
+            )
+            if status == 401:
+                self.app_token.invalidate()
+            if status != 200 or body is None:
+                raise LinkError(f"Helix users a répondu {status}")
+            found.update({u["id"]: u["login"] for u in body.get("data", [])})
+        return found
+
+    async def resync(self, guild: discord.Guild):
+        # Donne le rôle aux membres liés qui ne l'ont pas et met à jour les
+        # logins renommés. Le rôle n'est jamais retiré : il a pu être donné
+        # avant l'enregistrement des liaisons, ou à la main par un admin. Un
+        # compte absent de la réponse Helix (suspendu, même temporairement)
+        # reste lié. Les membres viennent du cache (get_member).
+        role = guild.get_role(self.role_id(guild.id))
+        if role is None:
+            raise LinkError("rôle follower non configuré")
+        found = await self._lookup(sorted({a["twitch_id"] for a in self.accounts.values()}))
+        changed = False
+        for account in self.accounts.values():
+            login = found.get(account["twitch_id"])
+            if login and login != account["login"]:
+                account["login"] = login
+                changed = True
+        if changed:
+            self.save()
+        added = 0
+        for user_id in self.accounts:
+            member = guild.get_member(int(user_id))
+            if member and role not in member.roles:
+                await member.add_roles(role, reason="Compte Twitch lié")
+                added += 1
+        return added
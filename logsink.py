@@ -0,0 +1,125 @@
+import time
+import asyncio
+import logging
+from collections import defaultdict
+
+import discord
+
+from ratelimit import RateLimiter, PRIORITY_NORMAL
+
+# --- File d'envoi des logs Discord ---
+# Les handlers d'événements déposent leurs lignes dans une file bornée et
+# reviennent tout de suite. Une tâche unique regroupe les lignes par salon en
+# messages d'au plus 2000 caractères, envoyés à 5 messages / 5 s par salon.
+# Quand la file est pleine, les lignes sont comptées puis résumées au lieu
+# d'être envoyées une à une. L'ordre d'arrivée est conservé dans chaque salon.
+# Un salon introuvable est réessayé après MISS_TTL secondes (permissions
+# corrigées, salon recréé...).
+
+MAX_MESSAGE_LEN = 2000
+SENDS_PER_CHANNEL = 5
+SENDS_WINDOW = 5
+MISS_TTL = 300
+
+
+def batch_lines(lines, limit=MAX_MESSAGE_LEN):
+    # Regroupe les lignes en blocs de `limit` caractères maximum
+    chunk, size = [], 0
+    for line in lines:
+        if len(line) > limit:
+            line = line[:limit - 1] + "…"
+        if chunk and size + 1 + len(line) > limit:
+            yield "\n".join(chunk)
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line) + (1 if size else 0)
+    if chunk:
+        yield "\n".join(chunk)
+
+
+class LogSink:
+    def __init__(self, bot, max_queue=1000, linger=1.0):
+        self.bot = bot
+        self.linger = linger
+        self.queue = asyncio.Queue(max_queue)
+        self.dropped = defaultdict(int)
+        self._channels = {}  # channel_id -> salon résolu
+        self._misses = {}    # channel_id -> instant (monotonic) du prochain essai
+        self._limiters = {}
+        self._task = None
+        self._held = None  # élément retiré de la file, pas encore envoyé
+        self.stats = {"lines": 0, "messages": 0, "dropped": 0}
+
+    def log(self, channel_id: int, line: str):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        try:
+            self.queue.put_nowait((channel_id, line))
+            self.stats["lines"] += 1
+        except asyncio.QueueFull:
+            self.dropped[channel_id] += 1
+            self.stats["dropped"] += 1
+
+    async def resolve(self, channel_id):
+        if channel_id in self._channels:
+            return self._channels[channel_id]
+        if self._misses.get(channel_id, 0) > time.monotonic():
+            return None
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            try:
+                channel = await self.bot.fetch_channel(channel_id)
+            except (discord.NotFound, discord.Forbidden):
+                logging.error(f"Salon de logs {channel_id} introuvable (nouvel essai dans {MISS_TTL}s)")
+                self._misses[channel_id] = time.monotonic() + MISS_TTL
+                return None
+        self._misses.pop(channel_id, None)
+        self._channels[channel_id] = channel
+        return channel
+
+    def _limiter(self, channel_id):
+        limiter = self._limiters.get(channel_id)
+        if limiter is None:
+            limiter = RateLimiter(f"log:{channel_id}", SENDS_PER_CHANNEL, SENDS_WINDOW, header_prefix="")
+            self._limiters[channel_id] = limiter
+        return limiter
+
+    def _drain(self, first=None):
+        # `first` : élément déjà retiré de la file, le plus ancien
+        pending = defaultdict(list)
+        if first is not None:
+            pending[first[0]].append(first[1])
+        while not self.queue.empty():
+            channel_id, line = self.queue.get_nowait()
+            pending[channel_id].append(line)
+        for channel_id, count in self.dropped.items():
+            pending[channel_id].append(f"⚠️ {count} événement(s) non journalisé(s) (file de logs pleine)")
+        self.dropped.clear()
+        return pending
+
+    async def _run(self):
+        while True:
+            self._held = await self.queue.get()
+            # Laisse les événements d'une rafale s'accumuler avant d'envoyer
+            await asyncio.sleep(self.linger)
+            pending, self._held = self._drain(self._held), None
+            await self._send(pending)
+
+    async def _send(self, pending):
+        for channel_id, lines in pending.items():
+            channel = await self.resolve(channel_id)
+            if channel is None:
+                continue
+            for content in batch_lines(lines):
+                await self._limiter(channel_id).acquire(PRIORITY_NORMAL)
+                try:
+                    await channel.send(content, allowed_mentions=discord.AllowedMentions.none())
+                    self.stats["messages"] += 1
+                except discord.HTTPException as e:
+                    logging.error(f"Envoi du log dans {channel_id} impossible : {e}")
+
+    async def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        pending, self._held = self._drain(self._held), None
+        await self._send(pending)
@@ -1,159 +1,209 @@
-import os
 import time
-import json
+
+# Avant les imports lourds : point de départ de la mesure du démarrage (!demarrage)
+STARTED = time.perf_counter()
+
+import os
 import random
+import signal
 import logging
 import asyncio
 from datetime import datetime, timedelta, timezone
-from urllib.parse import urlencode
 
 import discord
 from discord import ui
 from discord.ext import commands, tasks
-from aiohttp import web, ClientSession
+from aiohttp import web
 from dotenv import load_dotenv
 
+# Avant les imports locaux : settings et storage lisent l'environnement au chargement
+load_dotenv()
+
+from storage import store, load_data, save_data, guild_key, GuildState, migrate_to_guild, GUILD_KEYS
+from settings import settings, ConfigError, GUILD_FIELDS
+from alerts import broadcast
+from httpclient import http_client
+from ratelimit import RateLimited, PRIORITY_HIGH, PRIORITY_LOW, twitter_limiter, twitch_limiter
+from twitch import TwitchMonitor, AppToken
+from linking import TwitchLinker, LinkError
+from eventsub import EventSubHandler
+from dedupe import SnowflakeDedupe
+from squads import SquadRegistry
+from coalesce import MessageUpdateCoalescer
+from ephemeral import EphemeralVoiceManager
+from giveaways import GiveawayEngine, GIVEAWAY_EMOJI
+from logsink import LogSink
+from antiraid import RaidDetector, Thresholds
+from auditcache import AuditCache
+from persistent import PersistentPanels
+from interactions import InteractionRouter, reply
+
+startup = {"imports_ms": (time.perf_counter() - STARTED) * 1000, "extensions": {}, "ready_ms": None}
+
 # --- Configuration des intents et du bot ---
 intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True
 intents.voice_states = True
 intents.reactions = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+
+# --- Shards ---
+# SHARDED=1 passe en AutoShardedBot. Pour répartir les shards sur plusieurs
+# processus : SHARD_COUNT (total) et SHARD_IDS (ceux de ce processus, ex "0,1"),
+# chaque processus ayant alors son propre DATA_DB_FILE.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", 0))
+SHARD_IDS = [int(s) for s in os.getenv("SHARD_IDS", "").split(",") if s.strip()]
+SHARDED = os.getenv("SHARDED", "0") == "1" or bool(SHARD_COUNT)
+
+
+class TwitiseBot(commands.AutoShardedBot if SHARDED else commands.Bot):
+    async def setup_hook(self):
+        # Une seule fois par processus, avant la connexion : les reconnexions
+        # (on_ready répété) ne relancent ni les boucles ni les extensions
+        await start_services()
+
+    async def close(self):
+        # Extensions déchargées d'abord (Levels reporte son XP et son temps
+        # vocal en mémoire), puis le write-behind est vidé avant de couper
+        for name in list(self.extensions):
+            try:
+                await self.unload_extension(name)
+            except Exception as e:
+                logging.error(f"Déchargement de {name} à l'arrêt impossible : {e}")
+        await store.flush_pending()
+        await log_sink.close()
+        await super().close()
+
+
+def get_prefix(bot, message):
+    if message.guild is None:
+        return settings.guild_defaults["prefix"]
+    return settings.guild(message.guild.id).prefix
+
+
+bot_options = {}
+if SHARDED and SHARD_COUNT:
+    bot_options["shard_count"] = SHARD_COUNT
+if SHARDED and SHARD_IDS:
+    bot_options["shard_ids"] = SHARD_IDS
+bot = TwitiseBot(command_prefix=get_prefix, intents=intents, **bot_options)
 
 print("🚀 main.py chargé (version mise à jour)")
 
-# --- Chargement et configuration ---
-load_dotenv()
 logging.basicConfig(level=logging.INFO)
 
 # --- Variables d’environnement ---
+# Secrets et paramètres de déploiement uniquement : le reste (IDs par serveur,
+# délais, streamers suivis) est dans settings.py et se recharge à chaud
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
-CHANNEL_ID = int(os.getenv("CHANNEL_ID", 0))
-SQUAD_VC_CATEGORY_ID = int(os.getenv("SQUAD_VC_CATEGORY_ID", 0))
-SQUAD_ANNOUNCE_CHANNEL_ID = int(os.getenv("SQUAD_ANNOUNCE_CHANNEL_ID", 0))
-MEMBRE_ROLE_ID = int(os.getenv("MEMBRE_ROLE_ID", 0))
-GUIDE_CHANNEL_ID = int(os.getenv("GUIDE_CHANNEL_ID", 0))
-LOG_CHANNEL_ID = int(os.getenv("LOG_CHANNEL_ID", 0))
-LOG_ARRIVANTS_CHANNEL_ID = int(os.getenv("LOG_CHANNEL_ARRIVANTS_CHANNEL_ID", 0))
-LOG_CHANNEL_UPDATE_CHANNEL_ID = int(os.getenv("LOG_CHANNEL_UPDATE_CHANNEL_ID", 0))
-SQUAD_TEXT_CHANNEL_ID = int(os.getenv("SQUAD_TEXT_CHANNEL_ID", 0))
+# Serveur auquel rattacher les données d'avant le mode multi-serveur (sans lui,
+# elles vont au serveur unique vu au premier on_ready)
+LEGACY_GUILD_ID = int(os.getenv("LEGACY_GUILD_ID", os.getenv("GUILD_ID", 0)))
 
 TWITCH_CLIENT_ID = os.getenv("TWITCH_CLIENT_ID")
 TWITCH_CLIENT_SECRET = os.getenv("TWITCH_CLIENT_SECRET")
-TWITCH_STREAMER_LOGIN = os.getenv("TWITCH_STREAMER_LOGIN")
-TWITCH_ALERT_CHANNEL_ID = int(os.getenv("TWITCH_ALERT_CHANNEL_ID", 0))
-TWITCH_FOLLOWER_ROLE_ID = int(os.getenv("TWITCH_FOLLOWER_ROLE_ID", 0))
+# Sans secret, /webhook n'est pas exposé : personne ne peut signer de notification
+TWITCH_EVENTSUB_SECRET = os.getenv("TWITCH_EVENTSUB_SECRET", "")
+# Signature des liens de liaison Twitch ; sans elle, une clé aléatoire est tirée à
+# chaque démarrage et les liens en cours (data["link_states"]) deviennent invalides
+LINK_STATE_SECRET = os.getenv("LINK_STATE_SECRET", "")
 
 TWITTER_BEARER_TOKEN = os.getenv("TWITTER_BEARER_TOKEN")
 TWITTER_USERNAME = os.getenv("TWITTER_USERNAME")
-TWITTER_ALERT_CHANNEL_ID = int(os.getenv("TWITTER_ALERT_CHANNEL_ID", 0))
 TWITTER_USER_URL = f"https://api.twitter.com/2/users/by/username/{TWITTER_USERNAME}"
 
 WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
 WEBHOOK_PORT = int(os.getenv("PORT", 8080))
 
 UTC = timezone.utc
-DATA_FILE = "data.json"
 
 # --- Persistence des données ---
-def load_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r") as f:
-            return json.load(f)
-    return {
-        "linked_accounts": {},
-        "reglement_message_id": None,
-        "guide_message_id": None,
-        "twitter_posted_tweets": [],
-        "giveaways": {},
-        "tickets": {},
-        "polls": {},
-        "twitch_subscribers": {},
-        "active_squads": {}
-    }
-
-def save_data(data):
-    with open(DATA_FILE, "w") as f:
-        json.dump(data, f, indent=4)
-
+# Les données propres à un serveur sont sous data["guild:<id>:<nom>"] (voir storage.py)
 data = load_data()
+if LEGACY_GUILD_ID and migrate_to_guild(data, LEGACY_GUILD_ID):
+    save_data(data)
+posted_tweets = SnowflakeDedupe.from_data(data)
+squad_states = GuildState(data, "active_squads")
+squads = SquadRegistry(bot, squad_states)
+squad_updates = MessageUpdateCoalescer(window=1.5)
+vc_states = GuildState(data, "ephemeral_vcs")
+ephemeral_vcs = EphemeralVoiceManager(bot, vc_states, save=vc_states.save)
+bot.ephemeral_vcs = ephemeral_vcs
+giveaway_states = GuildState(data, "giveaways")
+giveaways = GiveawayEngine(bot, giveaway_states, save=giveaway_states.save)
+panel_states = GuildState(data, "panels")
+panels = PersistentPanels(bot, panel_states, save=panel_states.save)
+router = InteractionRouter()
+log_sink = LogSink(bot)
+raid_detector = RaidDetector(Thresholds.from_config(settings.common))
+audit_cache = AuditCache(per_channel=settings.common.audit_cache_per_channel)
+
+# TwitchMonitor partagé : le cog TwitchAlerts sonde, les handlers EventSub partagent son état
+bot.twitch_monitor = None
+# Token d'application commun au sondage des lives et à la liaison des comptes
+app_token = AppToken(TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET)
+linker = TwitchLinker(
+    bot, data.setdefault("linked_accounts", {}), TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET,
+    os.getenv("REDIRECT_URI"), app_token,
+    role_id=lambda guild_id: settings.guild(guild_id).twitch_follower_role_id,
+    secret=LINK_STATE_SECRET.encode() or None, pending=data.setdefault("link_states", {}),
+    save=lambda: save_data(data, "linked_accounts"), save_pending=lambda: save_data(data, "link_states")
+)
+twitter_user_id = None
 
 # --- Fonctions de log ---
-async def log_to_discord(message: str):
-    channel = bot.get_channel(LOG_CHANNEL_ID)
-    if not channel:
-        try:
-            channel = await bot.fetch_channel(LOG_CHANNEL_ID)
-        except discord.NotFound:
-            logging.error(f"Salon de logs introuvable (ID {LOG_CHANNEL_ID})")
-            return
-    await channel.send(f"📌 {message}")
-
-async def log_to_specific_channel(channel_id: int, message: str):
-    channel = bot.get_channel(channel_id)
-    if not channel:
-        try:
-            channel = await bot.fetch_channel(channel_id)
-        except discord.NotFound:
-            logging.error(f"Salon {channel_id} introuvable")
-            return
-    await channel.send(message)
+# Non bloquantes : les lignes partent dans log_sink, qui les regroupe par salon
+def log_to_discord(guild_id: int, message: str):
+    channel_id = settings.guild(guild_id).log_channel_id
+    if channel_id:
+        log_sink.log(channel_id, f"📌 {message}")
+
+def log_to_specific_channel(channel_id: int, message: str):
+    if channel_id:
+        log_sink.log(channel_id, message)
 
 # --- Twitter utils ---
 async def fetch_twitter_user_id():
-    async with ClientSession() as session:
-        async with session.get(TWITTER_USER_URL, headers={"Authorization": f"Bearer {TWITTER_BEARER_TOKEN}"}) as resp:
-            if resp.status == 429:
-                reset = resp.headers.get("x-rate-limit-reset")
-                if reset:
-                    await asyncio.sleep(max(int(reset) - int(time.time()), 0) + 1)
-                    return await fetch_twitter_user_id()
-                return None
-            if resp.status != 200:
-                return None
-            return (await resp.json()).get("data", {}).get("id")
+    try:
+        status, body = await http_client.request_json(
+            "GET", TWITTER_USER_URL, limiter=twitter_limiter, priority=PRIORITY_HIGH,
+            headers={"Authorization": f"Bearer {TWITTER_BEARER_TOKEN}"}
+        )
+    except RateLimited:
+        return None
+    if status != 200 or body is None:
+        return None
+    return body.get("data", {}).get("id")
 
 async def fetch_latest_tweets(user_id, since_id=None):
     params = {"max_results": 5, "tweet.fields": "created_at"}
     if since_id:
         params["since_id"] = since_id
-    async with ClientSession() as session:
-        async with session.get(f"https://api.twitter.com/2/users/{user_id}/tweets",
-                               headers={"Authorization": f"Bearer {TWITTER_BEARER_TOKEN}"}, params=params) as resp:
-            if resp.status == 429:
-                reset = resp.headers.get("x-rate-limit-reset")
-                if reset:
-                    await asyncio.sleep(max(int(reset) - int(time.time()), 0) + 1)
-                    return await fetch_latest_tweets(user_id, since_id)
-                return []
-            if resp.status != 200:
-                return []
-            return (await resp.json()).get("data", [])
+    try:
+        status, body = await http_client.request_json(
+            "GET", f"https://api.twitter.com/2/users/{user_id}/tweets", limiter=twitter_limiter,
+            priority=PRIORITY_LOW, headers={"Authorization": f"Bearer {TWITTER_BEARER_TOKEN}"}, params=params
+        )
+    except RateLimited:
+        return []
+    if status != 200 or body is None:
+        return []
+    return body.get("data", [])
 
 # --- Guide tutoriel ---
-async def envoyer_guide_tuto():
-    channel = bot.get_channel(GUIDE_CHANNEL_ID)
-    if not channel:
+GUIDE_PATH = "assets/squad-guide.png"
+
+async def envoyer_guide_tuto(guild: discord.Guild):
+    # L'image n'est renvoyée que si son contenu a changé (voir persistent.py)
+    channel = guild.get_channel(settings.guild(guild.id).guide_channel_id)
+    if not channel or not os.path.exists(GUIDE_PATH):
         return
-    if data.get("guide_message_id"):
-        try:
-            old = await channel.fetch_message(data["guide_message_id"])
-            await old.unpin()
-            await old.delete()
-        except:
-            pass
-    path = "assets/squad-guide.png"
-    if os.path.exists(path):
-        with open(path, "rb") as f:
-            file = discord.File(f, filename="squad-guide.png")
-            msg = await channel.send("📌 **Voici le guide pour créer une squad**", file=file)
-        try:
-            await msg.pin()
-        except:
-            pass
-        data["guide_message_id"] = msg.id
-        save_data(data)
+    legacy = data.pop(guild_key(guild.id, "guide_message_id"), None)
+    panels.adopt(guild.id, "guide", channel.id, legacy)
+    await panels.ensure(
+        guild.id, "guide", channel,
+        content="📌 **Voici le guide pour créer une squad**", file_path=GUIDE_PATH, pin=True
+    )
 
 # --- Règlement et vue du bouton ---
 reglement_texte = (
@@ -164,29 +214,29 @@ reglement_texte = (
 )
 
 class ReglementView(ui.View):
-    def __init__(self, client_id, redirect_uri):
+    # Affichage seulement : le clic est traité par router ("reglement:accept")
+    def __init__(self):
         super().__init__(timeout=None)
-        self.client_id = client_id
-        self.redirect_uri = redirect_uri
-
-    @ui.button(label="✅ J'accepte", style=discord.ButtonStyle.green, custom_id="accept_reglement")
-    async def accept(self, interaction: discord.Interaction, button: ui.Button):
-        role = interaction.guild.get_role(MEMBRE_ROLE_ID)
-        if role and role not in interaction.user.roles:
-            await interaction.user.add_roles(role)
-        q = urlencode({"client_id": self.client_id, "redirect_uri": self.redirect_uri,
-                       "response_type": "code", "scope": "user:read:email", "state": str(interaction.user.id)})
-        url = f"https://id.twitch.tv/oauth2/authorize?{q}"
-        await interaction.response.send_message(f"✅ Règlement accepté !\n🔗 {url}", ephemeral=True)
+        self.add_item(ui.Button(label="✅ J'accepte", style=discord.ButtonStyle.green, custom_id="reglement:accept"))
+
+# defer : add_roles peut dépasser la fenêtre de 3 s, la réponse part en suivi
+@router.route("reglement:accept", defer=True)
+@router.route("accept_reglement", defer=True)  # messages postés avant le routeur
+async def accept_reglement(interaction: discord.Interaction):
+    role = interaction.guild.get_role(settings.guild(interaction.guild.id).membre_role_id)
+    if role and role not in interaction.user.roles:
+        await interaction.user.add_roles(role)
+    # Lien signé, propre à ce membre et à ce serveur, valable une fois
+    await reply(interaction, f"✅ Règlement accepté !\n🔗 {linker.authorize_url(interaction.user)}")
 
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def reglement(ctx: commands.Context):
     embed = discord.Embed(title="Règlement du serveur", description=reglement_texte, color=discord.Color.blue())
-    view = ReglementView(TWITCH_CLIENT_ID, os.getenv("REDIRECT_URI"))
-    msg = await ctx.send(embed=embed, view=view)
-    data["reglement_message_id"] = msg.id
-    save_data(data)
+    msg = await ctx.send(embed=embed, view=ReglementView())
+    key = guild_key(ctx.guild.id, "reglement_message_id")
+    data[key] = msg.id
+    save_data(data, key)
 
 # --- Modération commands ---
 @bot.command(name="kick")
@@ -194,20 +244,231 @@ async def reglement(ctx: commands.Context):
 async def kick(ctx: commands.Context, member: discord.Member, *, reason: str=None):
     await member.kick(reason=reason)
     await ctx.send(f"👢 {member} expulsé. Raison : {reason or 'Non spécifiée'}")
-    await log_to_discord(f"{member} expulsé. Raison : {reason or 'Non spécifiée'}")
+    log_to_discord(ctx.guild.id, f"{member} expulsé. Raison : {reason or 'Non spécifiée'}")
 
 @bot.command(name="ban")
 @commands.has_permissions(ban_members=True)
 async def ban(ctx: commands.Context, member: discord.Member, *, reason: str=None):
     await member.ban(reason=reason)
     await ctx.send(f"🔨 {member} banni. Raison : {reason or 'Non spécifiée'}")
-    await log_to_discord(f"{member} banni. Raison : {reason or 'Non spécifiée'}")
+    log_to_discord(ctx.guild.id, f"{member} banni. Raison : {reason or 'Non spécifiée'}")
 
-@bot.command()
-@commands.has_permissions(manage_messages=True)
-async def clear(ctx: commands.Context, amount: int=5):
-    deleted = await ctx.channel.purge(limit=amount+1)
-    await ctx.send(f"🧹 {len(deleted)-1} messages supprimés.", delete_after=3)
+@bot.command(name="giveaway")
+@commands.has_permissions(administrator=True)
+async def giveaway(ctx: commands.Context, minutes: int=None, *, prize: str=None):
+    if not minutes or minutes <= 0 or not prize:
+        return await ctx.send("❌ Utilisation: !giveaway <minutes> <lot>")
+    end = datetime.now(UTC) + timedelta(minutes=minutes)
+    msg = await ctx.send(
+        f"{GIVEAWAY_EMOJI} **Giveaway : {prize}**\nRéagis avec {GIVEAWAY_EMOJI} pour participer ! "
+        f"Fin <t:{int(end.timestamp())}:R>"
+    )
+    await msg.add_reaction(GIVEAWAY_EMOJI)
+    giveaways.add(ctx.guild.id, msg.id, ctx.channel.id, msg.id, prize, end)
+
+@bot.command(name="stockage")
+@commands.has_permissions(administrator=True)
+async def stockage(ctx: commands.Context):
+    st = store.get_stats()
+    await ctx.send(
+        f"💾 Flushs : {st['flushes']} | Mutations : {st['mutations']} (en attente : {st['pending']})\n"
+        f"📦 Mutations/flush : {st['avg_batch']:.1f} (dernier : {st['last_batch']})\n"
+        f"⏱️ Latence flush : {st['avg_flush_ms']:.1f} ms moy. / {st['max_flush_ms']:.1f} ms max\n"
+        f"🗂️ Cache d'audit : {len(audit_cache)} messages, ~{audit_cache.memory() / 1024:.0f} Ko"
+    )
+
+@bot.command(name="quotas")
+@commands.has_permissions(administrator=True)
+async def quotas(ctx: commands.Context):
+    lines = []
+    for limiter in (twitter_limiter, twitch_limiter):
+        b = limiter.budget()
+        lines.append(
+            f"🌐 {b['api']} : {b['available']}/{b['limit']} restants, reset dans {b['reset_in']:.0f}s"
+            + (f", bloqué {b['blocked_for']:.0f}s" if b["blocked_for"] else "")
+            + f", {b['queued']} en file"
+        )
+    await ctx.send("\n".join(lines))
+
+@bot.command(name="twitchsync")
+@commands.has_permissions(administrator=True)
+async def twitchsync(ctx: commands.Context):
+    # Recale le rôle follower du serveur sur les comptes liés
+    try:
+        added = await linker.resync(ctx.guild)
+    except (LinkError, RateLimited) as e:
+        return await ctx.send(f"❌ Resynchronisation impossible : {e}")
+    await ctx.send(
+        f"🔗 {len(linker.accounts)} comptes liés : rôle ajouté à {added} "
+        f"(liaisons : {linker.stats['linked']}, refus : {linker.stats['refused']})"
+    )
+
+@bot.command(name="latence")
+@commands.has_permissions(administrator=True)
+async def latence(ctx: commands.Context):
+    await ctx.send("\n".join(router.report()) or "Aucune interaction routée.")
+
+# --- Configuration ---
+@bot.group(name="config", invoke_without_command=True)
+@commands.has_permissions(administrator=True)
+async def config(ctx: commands.Context):
+    cfg = settings.guild(ctx.guild.id)
+    overridden = settings.overrides.get(ctx.guild.id, {})
+    lines = [f"{'✏️' if name in overridden else '▫️'} `{name}` = {getattr(cfg, name)}" for name in GUILD_FIELDS]
+    await ctx.send("⚙️ **Configuration du serveur** (✏️ = propre à ce serveur)\n" + "\n".join(lines))
+
+@config.command(name="set")
+@commands.has_permissions(administrator=True)
+async def config_set(ctx: commands.Context, name: str, *, value: str):
+    try:
+        value = settings.set_guild(ctx.guild.id, name, value)
+    except ConfigError as e:
+        return await ctx.send(f"❌ {e}")
+    await ctx.send(f"✅ `{name}` = {value}")
+
+@config.command(name="reload")
+@commands.has_permissions(administrator=True)
+async def config_reload(ctx: commands.Context):
+    error = settings.reload()
+    if error:
+        return await ctx.send(f"❌ Configuration refusée, l'ancienne reste en place : {error}")
+    await ctx.send("🔄 Configuration rechargée.")
+
+@tasks.loop(seconds=15)
+async def config_watch_loop():
+    # Recharge config.json dès qu'il est modifié sur le disque
+    if settings.changed():
+        settings.reload()
+
+@settings.on_reload
+def apply_settings(s):
+    common = s.common
+    ephemeral_vcs.register("squad", common.squad_empty_grace, expire_squad)
+    ephemeral_vcs.register("temp", common.temp_vc_grace)
+    if bot.twitch_monitor:
+        bot.twitch_monitor.logins = sorted({l.strip().lower() for l in common.streamer_logins})
+    raid_detector.configure(Thresholds.from_config(common))
+    audit_cache.resize(common.audit_cache_per_channel)
+    if bot.is_ready():
+        asyncio.create_task(sync_extensions())
+
+# --- Extensions ---
+def extension_name(name: str):
+    return name if "." in name else f"cogs.{name}"
+
+async def load_feature(name: str):
+    # Le temps mesuré couvre l'import du module et son setup()
+    name = extension_name(name)
+    started = time.perf_counter()
+    await bot.load_extension(name)
+    startup["extensions"][name] = (time.perf_counter() - started) * 1000
+
+async def sync_extensions():
+    # Charge les extensions listées dans la configuration et décharge les autres
+    wanted = {extension_name(n) for n in settings.common.extensions}
+    for name in sorted(wanted - set(bot.extensions)):
+        try:
+            await load_feature(name)
+        except commands.ExtensionError as e:
+            logging.error(f"Extension {name} non chargée : {e}")
+    for name in sorted(set(bot.extensions) - wanted):
+        await bot.unload_extension(name)
+        startup["extensions"].pop(name, None)
+
+@bot.group(name="extension", invoke_without_command=True)
+@commands.has_permissions(administrator=True)
+async def extension(ctx: commands.Context):
+    lines = [
+        f"🧩 `{name}` : {startup['extensions'].get(name, 0):.0f} ms" for name in sorted(bot.extensions)
+    ]
+    await ctx.send("\n".join(lines) or "Aucune extension chargée.")
+
+@extension.command(name="load")
+@commands.has_permissions(administrator=True)
+async def extension_load(ctx: commands.Context, name: str):
+    try:
+        await load_feature(name)
+    except commands.ExtensionError as e:
+        return await ctx.send(f"❌ {e}")
+    await ctx.send(f"✅ `{extension_name(name)}` chargée en {startup['extensions'][extension_name(name)]:.0f} ms")
+
+@extension.command(name="unload")
+@commands.has_permissions(administrator=True)
+async def extension_unload(ctx: commands.Context, name: str):
+    try:
+        await bot.unload_extension(extension_name(name))
+    except commands.ExtensionError as e:
+        return await ctx.send(f"❌ {e}")
+    startup["extensions"].pop(extension_name(name), None)
+    await ctx.send(f"✅ `{extension_name(name)}` déchargée")
+
+@extension.command(name="reload")
+@commands.has_permissions(administrator=True)
+async def extension_reload(ctx: commands.Context, name: str):
+    try:
+        await bot.reload_extension(extension_name(name))
+    except commands.ExtensionError as e:
+        return await ctx.send(f"❌ {e}")
+    await ctx.send(f"🔄 `{extension_name(name)}` rechargée")
+
+@bot.command(name="demarrage")
+@commands.has_permissions(administrator=True)
+async def demarrage(ctx: commands.Context):
+    ext = startup["extensions"]
+    lines = [
+        f"📦 Imports de main.py : {startup['imports_ms']:.0f} ms",
+        f"🧩 Extensions : {sum(ext.values()):.0f} ms"
+    ] + [f"  • `{name}` : {ms:.0f} ms" for name, ms in sorted(ext.items(), key=lambda kv: -kv[1])]
+    if startup["ready_ms"] is not None:
+        lines.append(f"✅ Prêt en {startup['ready_ms'] / 1000:.1f} s")
+    await ctx.send("\n".join(lines))
+
+# --- Anti-raid ---
+raid_tasks = set()
+
+def run_raid_actions(guild: discord.Guild, actions):
+    # Les sanctions partent en tâche de fond : le handler d'événement rend la main aussitôt
+    for action in actions:
+        task = asyncio.create_task(apply_raid_action(guild, action))
+        raid_tasks.add(task)
+        task.add_done_callback(raid_tasks.discard)
+
+async def apply_raid_action(guild: discord.Guild, action):
+    try:
+        if action.kind == "timeout":
+            member = guild.get_member(action.user_ids[0])
+            minutes = settings.guild(guild.id).spam_timeout_minutes
+            if member and minutes:
+                await member.timeout(timedelta(minutes=minutes), reason=action.reason)
+                log_to_discord(guild.id, f"🔇 {member} réduit au silence {minutes} min : {action.reason}")
+        elif action.kind == "lockdown":
+            key = guild_key(guild.id, "raid_lockdown")
+            if data.get(key) is None:
+                data[key] = guild.verification_level.value
+                save_data(data, key)
+            await guild.edit(verification_level=discord.VerificationLevel.highest, reason=action.reason)
+            log_to_discord(guild.id, f"🚨 Raid détecté ({action.reason}) : serveur verrouillé, `!unlock` pour lever")
+        elif action.kind == "ban":
+            results = await asyncio.gather(
+                *(guild.ban(discord.Object(uid), reason=action.reason, delete_message_seconds=3600)
+                  for uid in action.user_ids),
+                return_exceptions=True
+            )
+            banned = sum(1 for r in results if not isinstance(r, Exception))
+            log_to_discord(guild.id, f"🔨 Raid : {banned}/{len(action.user_ids)} comptes bannis")
+    except discord.HTTPException as e:
+        logging.error(f"Action anti-raid {action.kind} impossible : {e}")
+
+@bot.command(name="unlock")
+@commands.has_permissions(administrator=True)
+async def unlock(ctx: commands.Context):
+    key = guild_key(ctx.guild.id, "raid_lockdown")
+    previous = data.pop(key, None)
+    raid_detector.unlock(ctx.guild.id)
+    if previous is not None:
+        await ctx.guild.edit(verification_level=discord.VerificationLevel(previous), reason="Fin du lockdown")
+        save_data(data, key)
+    await ctx.send("🔓 Serveur déverrouillé.")
 
 @bot.command(name="link")
 @commands.has_permissions(administrator=True)
@@ -220,44 +481,141 @@ async def link(ctx: commands.Context, *, url: str=None):
 # --- Logs d’événements ---
 @bot.event
 async def on_member_join(member: discord.Member):
-    await log_to_specific_channel(LOG_ARRIVANTS_CHANNEL_ID, f"👋 {member.mention} a rejoint")
+    log_to_specific_channel(settings.guild(member.guild.id).log_arrivants_channel_id, f"👋 {member.mention} a rejoint")
+    run_raid_actions(member.guild, raid_detector.on_join(member.guild.id, member.id))
+
+@bot.listen("on_message")
+async def detect_spam(msg: discord.Message):
+    if msg.guild:
+        audit_cache.add(msg)
+    if msg.guild and not msg.author.bot:
+        run_raid_actions(msg.guild, raid_detector.on_message(msg.guild.id, msg.author.id, msg.content))
 
 @bot.event
 async def on_member_remove(member: discord.Member):
-    await log_to_discord(f"👋 {member.name} a quitté")
+    log_to_discord(member.guild.id, f"👋 {member.name} a quitté")
 
 @bot.event
 async def on_guild_channel_update(before, after):
     if before.name != after.name:
-        await log_to_specific_channel(LOG_CHANNEL_UPDATE_CHANNEL_ID, f"🛠️ {before.name} -> {after.name}")
+        log_to_specific_channel(settings.guild(after.guild.id).log_channel_update_channel_id, f"🛠️ {before.name} -> {after.name}")
+
+# Événements "raw" : déclenchés même pour les messages absents du cache de discord.py,
+# le contenu vient alors d'audit_cache
+def describe_deleted(channel_id: int, message_id: int):
+    entry = audit_cache.pop(channel_id, message_id)
+    if entry is None:
+        return f"🗑️ Supprimé dans <#{channel_id}> : message {message_id} (contenu inconnu)"
+    if entry.bot:
+        return None
+    author = bot.get_user(entry.author_id) or f"<@{entry.author_id}>"
+    files = "".join(f"\n📎 {url}" for url in entry.attachments)
+    return f"🗑️ Supprimé: {author}: {entry.content}{files}"
 
 @bot.event
-async def on_message_delete(msg: discord.Message):
-    if not msg.author.bot:
-        await log_to_discord(f"🗑️ Supprimé: {msg.author}: {msg.content}")
+async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+    if payload.guild_id:
+        panels.forget_message(payload.guild_id, payload.message_id)
+        line = describe_deleted(payload.channel_id, payload.message_id)
+        if line:
+            log_to_discord(payload.guild_id, line)
 
 @bot.event
-async def on_message_edit(before, after):
-    if not before.author.bot and before.content != after.content:
-        await log_to_discord(f"✏️ Édité par {before.author} dans {before.channel}\nAvant: {before.content}\nAprès: {after.content}")
+async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+    if not payload.guild_id:
+        return
+    lines = [describe_deleted(payload.channel_id, mid) for mid in sorted(payload.message_ids)]
+    lines = [l for l in lines if l]
+    log_to_discord(payload.guild_id, f"🧹 {len(payload.message_ids)} messages supprimés en masse dans <#{payload.channel_id}>")
+    for line in lines:
+        log_to_discord(payload.guild_id, line)
 
-# --- on_ready: envoi bouton squad ---
 @bot.event
-async def on_ready():
-    print(f"✅ Connecté en tant que {bot.user}")
-    channel = bot.get_channel(SQUAD_TEXT_CHANNEL_ID)
+async def on_raw_message_edit(payload: discord.RawMessageUpdateEvent):
+    content = payload.data.get("content")
+    author = payload.data.get("author", {})
+    if content is None or author.get("bot") or not payload.data.get("guild_id"):
+        return
+    # Épinglage, aperçu de lien (embed) : MESSAGE_UPDATE sans édition du texte
+    if payload.data.get("edited_timestamp") is None:
+        return
+    entry = audit_cache.get(payload.channel_id, payload.message_id)
+    before = entry.content if entry else "(inconnu)"
+    if entry and not audit_cache.update_content(entry, content):
+        return
+    log_to_discord(
+        int(payload.data["guild_id"]),
+        f"✏️ Édité par {author.get('username', author.get('id'))} dans <#{payload.channel_id}>\n"
+        f"Avant: {before}\nAprès: {content}"
+    )
+
+# --- Préparation des serveurs (bouton squad, guide) ---
+prepared_guilds = set()
+
+async def prepare_guild(guild: discord.Guild):
+    if guild.id in prepared_guilds:
+        return
+    prepared_guilds.add(guild.id)
+    channel = guild.get_channel(settings.guild(guild.id).squad_text_channel_id)
     if channel:
-        button = ui.Button(label="Créer un squad", style=discord.ButtonStyle.primary, custom_id="create_squad")
-        view = ui.View()
+        button = ui.Button(label="Créer un squad", style=discord.ButtonStyle.primary, custom_id="squad:create")
+        view = ui.View(timeout=None)
         view.add_item(button)
-        await channel.send("Clique sur le bouton pour créer un squad :", view=view)
-        print(f"🎮 Bouton envoyé dans le salon {CHANNEL_ID}")
-    bot.add_view(ReglementView(TWITCH_CLIENT_ID, os.getenv("REDIRECT_URI")))
-    cleanup_empty_vcs.start()
-    check_giveaways.start()
-    twitch_check_loop.start()
-    twitter_check_loop.start()
-    await envoyer_guide_tuto()
+        # Édité sur place s'il existe déjà, posté seulement la première fois
+        await panels.ensure(guild.id, "squad_button", channel, content="Clique sur le bouton pour créer un squad :", view=view)
+    await envoyer_guide_tuto(guild)
+
+async def prepare_guilds(guilds):
+    results = await asyncio.gather(*(prepare_guild(g) for g in guilds), return_exceptions=True)
+    for guild, result in zip(guilds, results):
+        if isinstance(result, Exception):
+            logging.error(f"Préparation du serveur {guild.id} impossible : {result}")
+
+@bot.event
+async def on_shard_ready(shard_id):
+    # En mode shardé, chaque shard prépare ses serveurs dès qu'il est prêt,
+    # sans attendre les autres
+    await prepare_guilds([g for g in bot.guilds if g.shard_id == shard_id])
+
+# --- on_ready: état partagé ---
+@bot.event
+async def on_ready():
+    print(f"✅ Connecté en tant que {bot.user} ({len(bot.guilds)} serveurs, {bot.shard_count or 1} shard(s))")
+    if startup["ready_ms"] is None:
+        startup["ready_ms"] = (time.perf_counter() - STARTED) * 1000
+        ext = ", ".join(f"{n} {ms:.0f} ms" for n, ms in startup["extensions"].items())
+        logging.info(
+            f"⏱️ Prêt en {startup['ready_ms'] / 1000:.1f} s (imports {startup['imports_ms']:.0f} ms ; {ext})"
+        )
+    # Avant tout await : les squads, le guide et les classements lisent ces clés
+    leftovers = [k for k in GUILD_KEYS if k in data]
+    if leftovers and len(bot.guilds) == 1:
+        # Bot mono-serveur d'avant : ses données reviennent sans ambiguïté à ce serveur
+        migrate_to_guild(data, bot.guilds[0].id)
+        save_data(data)
+    elif leftovers:
+        logging.warning(f"Données mono-serveur non rangées ({', '.join(leftovers)}) : définir LEGACY_GUILD_ID")
+    if not squads.rebuilt:
+        await restore_squads()
+    else:
+        # Reconnexion : seules les squads dont les membres ont changé sont rééditées
+        for entry in squads.refresh():
+            if entry.message:
+                squad_updates.schedule(entry.message, lambda entry=entry: render_squad(entry))
+    if not ephemeral_vcs.reconciled:
+        for vc_id in list(squads.squads):
+            vc = bot.get_channel(vc_id)
+            if vc_id not in ephemeral_vcs and vc:
+                ephemeral_vcs.track(vc, "squad")
+        await ephemeral_vcs.reconcile(
+            [g.get_channel(settings.guild(g.id).squad_vc_category_id) for g in bot.guilds]
+        )
+    else:
+        ephemeral_vcs.sweep()
+    # Démarré ici (et pas dans main) : les salons doivent être en cache avant un tirage en retard
+    giveaways.start()
+    if not SHARDED:
+        await prepare_guilds(bot.guilds)
 
 # --- Modal et interaction ---
 class SquadModal(ui.Modal, title="Créer ton squad"):
@@ -265,201 +623,225 @@ class SquadModal(ui.Modal, title="Créer ton squad"):
     squad_players = ui.TextInput(label="Nombre de joueurs (1, 2 ou 3)", placeholder="Ex: 2", required=True)
 
     async def on_submit(self, interaction: discord.Interaction):
-        players = self.squad_players.value
-        if players not in ['1','2','3']:
-            return await interaction.response.send_message("❌ Indique 1, 2 ou 3.", ephemeral=True)
-        await interaction.channel.send(f"!squad {players} {self.squad_name.value}")
-        await interaction.response.send_message(
-            f"✅ Commande envoyée : !squad {players} {self.squad_name.value}", ephemeral=True
-        )
-
-@bot.event
-async def on_interaction(interaction: discord.Interaction):
-    if interaction.type == discord.InteractionType.component and interaction.data.get("custom_id") == "create_squad":
-        await interaction.response.send_modal(SquadModal())
+        players = self.squad_players.value.strip()
+        if players not in ("1", "2", "3"):
+            return await reply(interaction, "❌ Indique 1, 2 ou 3.")
+        try:
+            validate_squad(interaction.guild, int(players), self.squad_name.value)
+        except SquadError as e:
+            return await reply(interaction, f"❌ {e}")
+        # Création directe (plus de message "!squad" relu par le bot) : une seule réponse, différée
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            entry = await create_squad(
+                interaction.guild, interaction.user, int(players), self.squad_name.value, interaction.channel
+            )
+        except (SquadError, discord.HTTPException) as e:
+            return await reply(interaction, f"❌ Création impossible : {e}")
+        await reply(interaction, f"✅ Squad créée : <#{entry.vc_id}>")
+
+@router.route("squad:create")
+@router.route("create_squad")  # messages postés avant le routeur
+async def open_squad_modal(interaction: discord.Interaction):
+    await interaction.response.send_modal(SquadModal())
+
+@bot.listen("on_interaction")
+async def route_interaction(interaction: discord.Interaction):
+    await router.dispatch(interaction)
+
+# --- Création de squad ---
+# Service commun à !squad et au modal. Tout est validé avant le premier appel
+# API ; une fois le salon créé, le déplacement du créateur et l'envoi de
+# l'annonce partent en parallèle. Le créateur est compté d'avance dans la
+# squad : son arrivée dans le salon ne provoque donc pas d'édition de l'annonce.
+SQUAD_MAX_PLAYERS = 99  # limite Discord de user_limit
+CHANNEL_NAME_MAX = 100
+
+class SquadError(Exception):
+    pass
+
+def validate_squad(guild: discord.Guild, players, game: str):
+    game = (game or "").strip()
+    if not players or not game:
+        raise SquadError("Usage: !squad <n> <jeu>")
+    if not 1 <= players <= SQUAD_MAX_PLAYERS:
+        raise SquadError(f"Le nombre de joueurs doit être entre 1 et {SQUAD_MAX_PLAYERS}.")
+    category = guild.get_channel(settings.guild(guild.id).squad_vc_category_id)
+    if not isinstance(category, discord.CategoryChannel):
+        raise SquadError("Catégorie introuvable.")
+    return category, game
+
+async def create_squad(guild: discord.Guild, author: discord.Member, players: int, game: str,
+                       fallback_channel: discord.abc.Messageable):
+    category, game = validate_squad(guild, players, game)
+    suffix = f" - Squad {author.display_name} ({random.randint(1000, 9999)})"
+    vc = await guild.create_voice_channel(
+        name=game[:CHANNEL_NAME_MAX - len(suffix)] + suffix, category=category, user_limit=players
+    )
+    entry = squads.add(vc, players, game)
+    ephemeral_vcs.track(vc, "squad")
+    moving = bool(author.voice and author.voice.channel)
+    if moving:
+        entry.members[author.id] = author.display_name
+    view = SquadJoinButton(vc.id, players)
+    view.set_full(entry.full)
+    entry.view = view
+    embed = entry.embed()
+    announce_channel = guild.get_channel(settings.guild(guild.id).squad_announce_channel_id) or fallback_channel
+    moved, msg = await asyncio.gather(
+        author.move_to(vc) if moving else asyncio.sleep(0),
+        announce_channel.send(embed=embed, view=view),
+        return_exceptions=True
+    )
+    if isinstance(msg, Exception):
+        logging.error(f"Annonce de la squad {vc.id} impossible : {msg}")
+    else:
+        squads.attach(entry, msg)
+        squad_updates.prime(msg.id, embed=embed, view=view)
+    if isinstance(moved, Exception):
+        # Déplacement refusé : le créateur n'est finalement pas dans la squad
+        entry.members.pop(author.id, None)
+        if entry.message:
+            squad_updates.schedule(entry.message, lambda: render_squad(entry))
+    squad_states.save(guild.id)
+    return entry
 
-# --- Commande squad ---
 @bot.command()
 async def squad(ctx: commands.Context, max_players: int=None, *, game_name: str=None):
-    if not max_players or not game_name:
-        return await ctx.send("Usage: !squad <n> <jeu>")
-    category = ctx.guild.get_channel(SQUAD_VC_CATEGORY_ID)
-    if not category:
-        return await ctx.send("Catégorie introuvable.")
-    suffix = random.randint(1000,9999)
-    vc_name = f"{game_name} - Squad {ctx.author.display_name} ({suffix})"
-    vc = await ctx.guild.create_voice_channel(
-        name=vc_name, category=category, user_limit=max_players
-    )
     try:
-        await ctx.author.move_to(vc)
-    except:
-        pass
-    view = SquadJoinButton(vc, max_players)
-    embed = discord.Embed(
-        title=vc.name,
-        description=(
-            f"🎮 Jeu : **{game_name}**\n"
-            f"👥 Joueurs : 0/{max_players}\n\n"
-            "👤 Aucun pour l'instant"
-        ),
-        color=discord.Color.green()
-    )
-    announce_channel = bot.get_channel(SQUAD_ANNOUNCE_CHANNEL_ID) or ctx.channel
-    msg = await announce_channel.send(embed=embed, view=view)
-    view.message = msg
-    data.setdefault("active_squads", {})[str(vc.id)] = {
-        "channel_id": announce_channel.id,
-        "message_id": msg.id
-    }
-    save_data(data)
+        await create_squad(ctx.guild, ctx.author, max_players, game_name, ctx.channel)
+    except SquadError as e:
+        await ctx.send(str(e))
+
+def render_squad(entry):
+    # Appelé une seule fois en fin de fenêtre de regroupement
+    kwargs = {"embed": entry.embed()}
+    if entry.view:
+        entry.view.set_full(entry.full)
+        kwargs["view"] = entry.view
+    return kwargs
+
+async def restore_squads():
+    # Premier on_ready : registre reconstruit depuis l'état. Les boutons
+    # "Rejoindre" restent valides : leur custom_id suffit au routeur
+    for stale in squads.rebuild():
+        if stale.message:
+            try:
+                await stale.message.delete()
+            except discord.HTTPException:
+                pass
+    for entry in squads.squads.values():
+        if not entry.message:
+            continue
+        entry.view = SquadJoinButton(entry.vc_id, entry.max_members)
+        entry.view.set_full(entry.full)
+        # Les arrivées/départs pendant l'arrêt sont rattrapés en une édition
+        squad_updates.schedule(entry.message, lambda entry=entry: render_squad(entry))
+    save_data(data, *(squad_states.key(guild.id) for guild in bot.guilds))
 
 class SquadJoinButton(ui.View):
-    def __init__(self, vc: discord.VoiceChannel, max_members: int):
+    # Affichage seulement : le clic ("squad:join:<vc_id>") est traité par router,
+    # ce qui garde le bouton valide après un redémarrage sans ré-enregistrer de vue
+    def __init__(self, vc_id: int, max_members: int):
         super().__init__(timeout=None)
-        self.vc = vc
+        self.vc_id = vc_id
         self.max_members = max_members
-        self.message: discord.Message = None
-
-    @ui.button(label="Rejoindre", style=discord.ButtonStyle.primary, custom_id="join_squad")
-    async def join(self, interaction: discord.Interaction, button: ui.Button):
-        user = interaction.user
-        if user.voice and user.voice.channel == self.vc:
-            return await interaction.response.send_message("Tu es déjà dans cette squad.", ephemeral=True)
-        players = [m for m in self.vc.members if not m.bot]
-        if len(players) >= self.max_members:
-            button.disabled = True
-            if self.message:
-                await self.message.edit(view=self)
-            return await interaction.response.send_message("Cette squad est pleine.", ephemeral=True)
-        await user.move_to(self.vc)
-        await interaction.response.send_message(f"Tu as rejoint **{self.vc.name}** !", ephemeral=True)
-        await asyncio.sleep(1)
-        players = [m for m in self.vc.members if not m.bot]
-        lines = [
-            f"🎮 Jeu : **{self.vc.name.split(' - ')[0]}**",
-            f"👥 Joueurs : {len(players)}/{self.max_members}",
-            "",
-            "👤 Membres :"
-        ] + [f"• {p.display_name}" for p in players]
-        embed = discord.Embed(title=self.vc.name, description="\n".join(lines), color=discord.Color.green())
-        if self.message:
-            await self.message.edit(embed=embed, view=self)
-        if not players or len(players) >= self.max_members:
-            if self.message:
-                try:
-                    await self.message.delete()
-                except:
-                    pass
+        self.join = ui.Button(label="Rejoindre", style=discord.ButtonStyle.primary, custom_id=f"squad:join:{vc_id}")
+        self.add_item(self.join)
+
+    def set_full(self, full: bool):
+        self.join.disabled = full
+
+@router.route("squad:join", defer=True)  # move_to : appel REST avant la réponse
+async def join_squad(interaction: discord.Interaction, vc_id: str):
+    user = interaction.user
+    entry = squads.get(int(vc_id))
+    vc = bot.get_channel(int(vc_id))
+    if not entry or vc is None:
+        return await reply(interaction, "Cette squad n'existe plus.")
+    if user.voice and user.voice.channel == vc:
+        return await reply(interaction, "Tu es déjà dans cette squad.")
+    if entry.full:
+        if entry.message:
+            squad_updates.schedule(entry.message, lambda: render_squad(entry))
+        return await reply(interaction, "Cette squad est pleine.")
+    try:
+        await user.move_to(vc)
+    except discord.HTTPException:
+        return await reply(interaction, "Connecte-toi d'abord à un salon vocal pour être déplacé.")
+    # L'annonce est mise à jour par on_voice_state_update via squad_updates
+    await reply(interaction, f"Tu as rejoint **{vc.name}** !")
+
+# --- Tâches récurrentes ---
+async def expire_squad(vc_id):
+    # Appelé par ephemeral_vcs quand le salon est resté vide tout le délai de grâce
+    entry = squads.remove(vc_id)
+    if entry:
+        squad_states.save(entry.guild_id)
+        if entry.message:
+            squad_updates.forget(entry.message_id)
             try:
-                await self.vc.delete()
-            except:
+                await entry.message.delete()
+            except discord.HTTPException:
                 pass
-            data.get("active_squads", {}).pop(str(self.vc.id), None)
-            save_data(data)
+    vc = bot.get_channel(vc_id)
+    if vc:
+        await vc.delete()
 
-# --- Tâches récurrentes ---
-@tasks.loop(minutes=1)
-async def cleanup_empty_vcs():
-    guild = bot.guilds[0] if bot.guilds else None
-    if guild:
-        cat = guild.get_channel(SQUAD_VC_CATEGORY_ID)
-        if cat:
-            for vc in cat.voice_channels:
-                if not vc.members:
-                    await vc.delete()
-
-@tasks.loop(seconds=30)
-async def check_giveaways():
-    now = datetime.now(UTC)
-    for gid, g in list(data.get("giveaways", {}).items()):
-        if now >= datetime.fromisoformat(g.get("end_time", now.isoformat())):
-            ch = bot.get_channel(g.get("channel_id", 0))
-            if ch:
-                try:
-                    msg = await ch.fetch_message(g.get("message_id", 0))
-                except:
-                    data["giveaways"].pop(gid, None)
-                    continue
-                users = [
-                    u for r in msg.reactions if str(r.emoji) == "🎉"
-                    for u in await r.users().flatten() if not u.bot
-                ]
-                if users:
-                    await ch.send(f"🎊 {random.choice(users).mention} a gagné {g.get('prize','')}")
-                else:
-                    await ch.send("Personne...")
-            data["giveaways"].pop(gid, None)
-            save_data(data)
-
-@tasks.loop(minutes=1)
-async def twitch_check_loop():
-    if twitch_monitor:
-        await twitch_monitor.check_stream()
+ephemeral_vcs.register("squad", settings.common.squad_empty_grace, expire_squad)
+ephemeral_vcs.register("temp", settings.common.temp_vc_grace)
 
 @tasks.loop(minutes=2)
 async def twitter_check_loop():
-    ch = bot.get_channel(TWITTER_ALERT_CHANNEL_ID)
-    if ch and twitter_user_id:
-        since = max(data.get("twitter_posted_tweets", ["0"]))
-        for tw in reversed(await fetch_latest_tweets(twitter_user_id, since_id=since)):
-            if tw.get("id") not in data.get("twitter_posted_tweets", []):
-                url = f"https://twitter.com/{TWITTER_USERNAME}/status/{tw.get('id')}"
-                await ch.send(f"🐦 Nouveau tweet ({tw.get('created_at')}): {tw.get('text')}\n{url}")
-                data.setdefault("twitter_posted_tweets", []).append(tw.get("id"))
-                save_data(data)
-
-# --- TwitchMonitor ---
-class TwitchMonitor:
-    def __init__(self, client_id, client_secret, streamer_login, alert_channel_id):
-        self.client_id = client_id
-        self.client_secret = client_secret
-        self.streamer_login = streamer_login
-        self.alert_channel_id = alert_channel_id
-        self.token = None
-        self.token_expiry = None
-        self.last_live = False
-        self.session = None
-
-    async def get_token(self):
-        self.session = ClientSession()
-        resp = await self.session.post(
-            "https://id.twitch.tv/oauth2/token",
-            params={
-                "client_id": self.client_id,
-                "client_secret": self.client_secret,
-                "grant_type": "client_credentials"
-            }
-        )
-        d = await resp.json()
-        self.token = d.get("access_token")
-        self.token_expiry = datetime.now(UTC) + timedelta(seconds=d.get("expires_in", 3600))
-
-    async def check_stream(self):
-        if not self.token or datetime.now(UTC) >= self.token_expiry:
-            await self.get_token()
-        h = {"Client-ID": self.client_id, "Authorization": f"Bearer {self.token}"}
-        resp = await self.session.get(
-            f"https://api.twitch.tv/helix/streams?user_login={self.streamer_login}", headers=h
-        )
-        data_json = await resp.json()
-        streams = data_json.get("data")
-        ch = bot.get_channel(self.alert_channel_id)
-        if streams and not self.last_live:
-            self.last_live = True
-            title = streams[0].get("title", "")
-            await ch.send(f"🔴 {self.streamer_login} est en live : **{title}** https://twitch.tv/{self.streamer_login}")
-        elif not streams:
-            self.last_live = False
+    watching = any(settings.guild(g.id).twitter_alert_channel_id for g in bot.guilds)
+    if watching and twitter_user_id:
+        tweets = await fetch_latest_tweets(twitter_user_id, since_id=posted_tweets.since_id)
+        for tw in sorted(tweets, key=lambda t: int(t["id"])):
+            if posted_tweets.is_new(tw["id"]):
+                url = f"https://twitter.com/{TWITTER_USERNAME}/status/{tw['id']}"
+                await broadcast(bot, "twitter_alert_channel_id", f"🐦 Nouveau tweet ({tw.get('created_at')}): {tw.get('text')}\n{url}")
+                posted_tweets.add(tw["id"])
+                save_data(data, "twitter_dedupe")
+    # Espace les sondages selon le quota restant plutôt que d'aller jusqu'au 429
+    twitter_check_loop.change_interval(seconds=twitter_limiter.pace(120))
+
+@twitter_check_loop.before_loop
+async def before_twitter_check():
+    await bot.wait_until_ready()
 
 # --- Webhook & OAuth handlers ---
-async def handle_webhook(request):
-    try:
-        payload = await request.json()
-        logging.info(f"Webhook reçu : {payload}")
-        return web.Response(text="OK")
-    except Exception as e:
-        return web.Response(status=400, text=str(e))
+handle_webhook = EventSubHandler(TWITCH_EVENTSUB_SECRET)
+
+@handle_webhook.on("stream.online")
+async def on_stream_online(event):
+    login = event.get("broadcaster_user_login", "").lower()
+    # Même état que le sondage : un live déjà annoncé n'est pas reposté
+    if data["twitch_live"].get(login) == event.get("id"):
+        return
+    data["twitch_live"][login] = event.get("id")
+    save_data(data, "twitch_live")
+    await broadcast(bot, "twitch_alert_channel_id", f"🔴 {event.get('broadcaster_user_name', login)} est en live ! https://twitch.tv/{login}")
+
+@handle_webhook.on("stream.offline")
+async def on_stream_offline(event):
+    if data["twitch_live"].pop(event.get("broadcaster_user_login", "").lower(), None):
+        save_data(data, "twitch_live")
+
+@handle_webhook.on("channel.follow")
+async def on_channel_follow(event):
+    await broadcast(bot, "twitch_alert_channel_id", f"💜 {event.get('user_name')} suit maintenant {event.get('broadcaster_user_name')} !")
+
+@handle_webhook.on("channel.subscribe")
+async def on_channel_subscribe(event):
+    data["twitch_subscribers"][event.get("user_id")] = {
+        "login": event.get("user_login"),
+        "tier": event.get("tier"),
+        "since": datetime.now(UTC).isoformat()
+    }
+    save_data(data, "twitch_subscribers")
+    await broadcast(
+        bot, "twitch_alert_channel_id", f"⭐ {event.get('user_name')} vient de s'abonner (tier {int(event.get('tier', 1000)) // 1000}) !"
+    )
 
 async def twitch_callback(request):
     params = request.rel_url.query
@@ -467,84 +849,64 @@ async def twitch_callback(request):
     state = params.get("state")
     if not code or not state:
         return web.Response(status=400, text="Missing code/state")
-    token_resp = await ClientSession().post(
-        "https://id.twitch.tv/oauth2/token",
-        data={
-            "client_id": TWITCH_CLIENT_ID,
-            "client_secret": TWITCH_CLIENT_SECRET,
-            "code": code,
-            "grant_type": "authorization_code",
-            "redirect_uri": os.getenv("REDIRECT_URI")
-        }
-    )
-    token_data = await token_resp.json()
-    access_token = token_data.get("access_token")
-    if not access_token:
-        return web.Response(status=400, text="No token")
-    headers = {"Authorization": f"Bearer {access_token}", "Client-Id": TWITCH_CLIENT_ID}
-    user_resp = await ClientSession().get("https://api.twitch.tv/helix/users", headers=headers)
-    user_data = await user_resp.json()
-    login = user_data.get("data", [{}])[0].get("login")
-    guild = bot.guilds[0] if bot.guilds else None
-    if guild:
-        try:
-            member = await guild.fetch_member(int(state))
-            role = guild.get_role(TWITCH_FOLLOWER_ROLE_ID)
-            if member and role:
-                await member.add_roles(role)
-        except:
-            pass
-    return web.Response(text="Linked")
+    try:
+        login = await linker.complete(code, state)
+    except LinkError as e:
+        logging.warning(f"Liaison Twitch refusée : {e}")
+        return web.Response(status=400, text=f"Link refused: {e}")
+    return web.Response(text=f"Linked to {login}")
 
 @bot.event
 async def on_voice_state_update(member, before, after):
-    for ch in (before.channel, after.channel):
-        if not ch or str(ch.id) not in data.get("active_squads", {}):
-            continue
-        info = data["active_squads"].get(str(ch.id), {})
-        announce_ch = bot.get_channel(info.get("channel_id"))
-        try:
-            msg = await announce_ch.fetch_message(info.get("message_id"))
-        except:
-            continue
-        membs = [m for m in ch.members if not m.bot]
-        if not membs:
-            await msg.delete()
-            await ch.delete()
-            data["active_squads"].pop(str(ch.id), None)
-            save_data(data)
-        else:
-            desc = (
-                f"🎮 {ch.name.split(' - ')[0]}\n"
-                f"👥 {len(membs)}/{ch.user_limit}\n" +
-                "\n".join(f"• {m.display_name}" for m in membs)
-            )
-            await msg.edit(embed=discord.Embed(title=ch.name, description=desc, color=discord.Color.green()))
+    # Un salon éphémère vidé est supprimé après son délai de grâce (expire_squad pour les squads)
+    ephemeral_vcs.on_voice_state_update(member, before, after)
+    for entry in squads.on_voice_state_update(member, before, after):
+        if entry.message:
+            # Les arrivées/départs rapprochés ne donnent qu'une seule édition
+            squad_updates.schedule(entry.message, lambda entry=entry: render_squad(entry))
 
 # --- exécution principale ---
+async def start_services():
+    # Appelé par setup_hook : boucles et extensions démarrées une seule fois
+    global twitter_user_id
+    if all([TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET, settings.common.streamer_logins]):
+        bot.twitch_monitor = TwitchMonitor(
+            TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET,
+            settings.common.streamer_logins, data.setdefault("twitch_live", {}), app_token=app_token
+        )
+    if TWITTER_BEARER_TOKEN and TWITTER_USERNAME:
+        twitter_user_id = await fetch_twitter_user_id()
+    await sync_extensions()
+    twitter_check_loop.start()
+    config_watch_loop.start()
+
 async def main():
     app = web.Application()
-    app.router.add_post("/webhook", handle_webhook)
+    if TWITCH_EVENTSUB_SECRET:
+        app.router.add_post("/webhook", handle_webhook)
+    else:
+        logging.warning("TWITCH_EVENTSUB_SECRET absent : webhook EventSub désactivé")
     app.router.add_get("/auth/twitch/callback", twitch_callback)
     runner = web.AppRunner(app)
     await runner.setup()
     await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
 
-    global twitch_monitor, twitter_user_id
-    if all([TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET, TWITCH_STREAMER_LOGIN, TWITCH_ALERT_CHANNEL_ID]):
-        twitch_monitor = TwitchMonitor(
-            TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET,
-            TWITCH_STREAMER_LOGIN, TWITCH_ALERT_CHANNEL_ID
-        )
-    if TWITTER_BEARER_TOKEN and TWITTER_USERNAME:
-        twitter_user_id = await fetch_twitter_user_id()
-
-    cleanup_empty_vcs.start()
-    check_giveaways.start()
-    twitch_check_loop.start()
-    twitter_check_loop.start()
+    # La plateforme arrête le processus par SIGTERM : fermeture propre (flush des données)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, lambda: asyncio.create_task(bot.close()))
+        except NotImplementedError:
+            pass  # Windows : seul Ctrl+C (KeyboardInterrupt) est disponible
 
-    await bot.start(DISCORD_TOKEN)
+    try:
+        await bot.start(DISCORD_TOKEN)
+    finally:
+        await ephemeral_vcs.close()
+        await giveaways.close()
+        await runner.cleanup()
+        await http_client.close()
+        await store.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,96 @@
+import hashlib
+import logging
+
+import discord
+
+from coalesce import fingerprint
+
+# --- Messages permanents (panneaux) ---
+# Bouton "Créer un squad", guide épinglé... : un message par (serveur, clé),
+# retrouvé depuis l'état persisté au lieu d'être reposté à chaque démarrage.
+# Une empreinte du contenu (texte, embed, composants et octets du fichier
+# joint) est gardée avec l'id du message : tant qu'elle ne change pas, aucun
+# appel API n'est fait. Sinon le message est édité sur place (pièce jointe
+# remplacée), et n'est renvoyé que s'il a disparu.
+# `states` donne, pour chaque serveur, le dict persisté "panels" :
+#   {clé: {"channel_id", "message_id", "hash"}}, persisté par `save(guild_id)`
+
+
+def content_hash(kwargs: dict, file_bytes: bytes = None) -> str:
+    h = hashlib.sha256(fingerprint(kwargs).encode())
+    if file_bytes is not None:
+        h.update(file_bytes)
+    return h.hexdigest()
+
+
+class PersistentPanels:
+    def __init__(self, bot, states, save=None):
+        self.bot = bot
+        self.states = states
+        self.save = save or (lambda guild_id: None)
+        self.stats = {"unchanged": 0, "edited": 0, "sent": 0}
+
+    def adopt(self, guild_id, key, channel_id, message_id):
+        # Reprend un message posté avant ce système (empreinte inconnue : une édition au prochain ensure)
+        state = self.states(guild_id)
+        if key not in state and message_id:
+            state[key] = {"channel_id": channel_id, "message_id": message_id, "hash": None}
+
+    def forget_message(self, guild_id, message_id):
+        # Message supprimé à la main : il sera reposté au prochain ensure
+        state = self.states(guild_id)
+        for key, entry in list(state.items()):
+            if entry.get("message_id") == message_id:
+                del state[key]
+                self.save(guild_id)
+                return key
+        return None
+
+    async def ensure(self, guild_id, key, channel, *, content=None, embed=None, view=None,
+                     file_path=None, pin=False):
+        kwargs = {"content": content, "embed": embed, "view": view}
+        file_bytes = None
+        if file_path:
+            with open(file_path, "rb") as f:
+                file_bytes = f.read()
+        digest = content_hash(kwargs, file_bytes)
+        state = self.states(guild_id)
+        entry = state.get(key)
+        if entry and entry.get("channel_id") == channel.id:
+            if view is not None and view.is_persistent():
+                self.bot.add_view(view, message_id=entry["message_id"])
+            if entry.get("hash") == digest:
+                self.stats["unchanged"] += 1
+                return entry["message_id"]
+            edit = {k: v for k, v in kwargs.items() if v is not None}
+            if file_bytes is not None:
+                edit["attachments"] = [discord.File(file_path, filename=file_path.rsplit("/", 1)[-1])]
+            try:
+                await channel.get_partial_message(entry["message_id"]).edit(**edit)
+                entry["hash"] = digest
+                self.save(guild_id)
+                self.stats["edited"] += 1
+                return entry["message_id"]
+            except discord.NotFound:
+                pass
+        elif entry:
+            # Salon changé dans la configuration : l'ancien message est retiré
+            old = self.bot.get_channel(entry.get("channel_id", 0))
+            if old:
+                try:
+                    await old.get_partial_message(entry["message_id"]).delete()
+                except discord.HTTPException:
+                    pass
+        send = {k: v for k, v in kwargs.items() if v is not None}
+        if file_bytes is not None:
+            send["file"] = discord.File(file_path, filename=file_path.rsplit("/", 1)[-1])
+        msg = await channel.send(**send)
+        if pin:
+            try:
+                await msg.pin()
+            except discord.HTTPException as e:
+                logging.warning(f"Épinglage du panneau {key} impossible : {e}")
+        state[key] = {"channel_id": channel.id, "message_id": msg.id, "hash": digest}
+        self.save(guild_id)
+        self.stats["sent"] += 1
+        return msg.id
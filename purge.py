@@ -0,0 +1,149 @@
+import re
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+import discord
+
+# --- Purge de salon en flux ---
+# L'historique est parcouru page par page (du plus récent au plus ancien) et
+# les messages retenus sont supprimés au fil de l'eau : seuls les ids du lot
+# en cours (100 au plus) sont gardés en mémoire, quel que soit le nombre de
+# messages. Les messages de moins de 14 jours partent par suppressions
+# groupées de BULK_SIZE ; Discord refuse les plus anciens en groupe, ils sont
+# donc supprimés un par un, espacés de SINGLE_DELETE_INTERVAL secondes pour
+# ne pas épuiser le quota de la route. Une purge peut être annulée à tout
+# moment ; sa progression est remontée toutes les PROGRESS_INTERVAL secondes.
+
+UTC = timezone.utc
+BULK_SIZE = 100
+# Marge sous la limite de 14 jours : une purge longue ne doit pas voir un
+# message vieillir au-delà pendant qu'il attend dans un lot
+BULK_MAX_AGE = timedelta(days=14) - timedelta(minutes=30)
+SINGLE_DELETE_INTERVAL = 1.2
+PROGRESS_INTERVAL = 5
+# Messages parcourus au plus par message demandé, quand des filtres écartent la plupart
+SCAN_FACTOR = 20
+
+
+class PurgeFilter:
+    __slots__ = ("user_id", "pattern", "attachments")
+
+    def __init__(self, user_id=None, pattern=None, attachments=False):
+        self.user_id = user_id
+        self.pattern = re.compile(pattern, re.IGNORECASE) if pattern else None
+        self.attachments = attachments
+
+    def __call__(self, message: discord.Message):
+        if message.pinned:
+            return False
+        if self.user_id and message.author.id != self.user_id:
+            return False
+        if self.attachments and not message.attachments:
+            return False
+        if self.pattern and not self.pattern.search(message.content):
+            return False
+        return True
+
+    def describe(self):
+        parts = []
+        if self.user_id:
+            parts.append(f"de <@{self.user_id}>")
+        if self.pattern:
+            parts.append(f"contenant /{self.pattern.pattern}/")
+        if self.attachments:
+            parts.append("avec pièce jointe")
+        return ", ".join(parts)
+
+
+class PurgeJob:
+    def __init__(self, channel, amount, check=None, before=None, scan_limit=None):
+        self.channel = channel
+        self.amount = amount
+        self.check = check or PurgeFilter()
+        self.before = before
+        self.scan_limit = scan_limit or amount * SCAN_FACTOR
+        self.cancelled = False
+        self.done = False
+        self.started = time.monotonic()
+        self.stats = {"scanned": 0, "deleted": 0, "bulk_calls": 0, "single": 0, "failed": 0}
+        self._batch = []  # ids récents en attente de suppression groupée
+
+    def cancel(self):
+        self.cancelled = True
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def summary(self):
+        st = self.stats
+        state = "annulée" if self.cancelled else "terminée" if self.done else "en cours"
+        return (
+            f"🧹 Purge {state} : {st['deleted']}/{self.amount} supprimés "
+            f"({st['scanned']} parcourus, {st['bulk_calls']} lots, {st['single']} anciens un par un"
+            + (f", {st['failed']} échecs" if st["failed"] else "")
+            + f") en {self.elapsed:.0f}s"
+        )
+
+    async def _flush(self):
+        if not self._batch:
+            return
+        batch = [discord.Object(id=mid) for mid in self._batch]
+        self._batch.clear()
+        try:
+            await self.channel.delete_messages(batch, reason="Purge")
+            self.stats["deleted"] += len(batch)
+            self.stats["bulk_calls"] += 1
+        except discord.NotFound:
+            # Un message du lot a déjà disparu : Discord refuse tout le lot
+            for obj in batch:
+                await self._delete_one(obj, throttle=False)
+        except discord.HTTPException as e:
+            self.stats["failed"] += len(batch)
+            logging.warning(f"Suppression groupée refusée dans #{self.channel} : {e}")
+
+    async def _delete_one(self, message, throttle=True):
+        try:
+            await self.channel.get_partial_message(message.id).delete()
+            self.stats["deleted"] += 1
+            self.stats["single"] += 1
+        except discord.NotFound:
+            pass
+        except discord.HTTPException as e:
+            self.stats["failed"] += 1
+            logging.warning(f"Suppression du message {message.id} refusée : {e}")
+        if throttle:
+            await asyncio.sleep(SINGLE_DELETE_INTERVAL)
+
+    def _remaining(self):
+        return self.amount - self.stats["deleted"] - len(self._batch)
+
+    async def run(self, progress=None):
+        # progress(job) : coroutine appelée au plus toutes les PROGRESS_INTERVAL secondes
+        bulk_after = datetime.now(UTC) - BULK_MAX_AGE
+        last_report = time.monotonic()
+        try:
+            async for message in self.channel.history(limit=self.scan_limit, before=self.before):
+                if self.cancelled or self._remaining() <= 0:
+                    break
+                self.stats["scanned"] += 1
+                if self.check(message):
+                    if message.created_at > bulk_after:
+                        self._batch.append(message.id)
+                        if len(self._batch) >= BULK_SIZE:
+                            await self._flush()
+                    else:
+                        # L'historique descend : plus aucun message récent ne suivra
+                        await self._flush()
+                        await self._delete_one(message)
+                if progress and time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                    last_report = time.monotonic()
+                    await progress(self)
+            if not self.cancelled:
+                await self._flush()
+        finally:
+            self._batch.clear()
+            self.done = True
+        return self.stats["deleted"]
@@ -0,0 +1,40 @@
+from sortedcontainers import SortedList
+
+# --- Index de classement ---
+# Scores triés en permanence (SortedList de (-score, user_id)) : mise à jour,
+# rang d'un membre et top N en O(log n), sans retrier tous les membres à
+# chaque commande.
+
+
+class RankIndex:
+    def __init__(self, scores: dict = None):
+        self.scores = dict(scores or {})
+        self._sorted = SortedList((-s, uid) for uid, s in self.scores.items())
+
+    def __len__(self):
+        return len(self.scores)
+
+    def get(self, user_id):
+        return self.scores.get(user_id, 0)
+
+    def set(self, user_id, score):
+        old = self.scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self._sorted.remove((-old, user_id))
+        self.scores[user_id] = score
+        self._sorted.add((-score, user_id))
+
+    def add(self, user_id, delta):
+        self.set(user_id, self.scores.get(user_id, 0) + delta)
+
+    def rank(self, user_id):
+        # Rang 1-based, ou None si le membre n'a pas de score
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return self._sorted.index((-score, user_id)) + 1
+
+    def top(self, n=10, offset=0):
+        return [(uid, -neg) for neg, uid in self._sorted.islice(offset, offset + n)]
@@ -0,0 +1,149 @@
+import time
+import heapq
+import random
+import asyncio
+import itertools
+
+# --- Ordonnanceur de requêtes sensible aux limites des API ---
+# Chaque API (Twitter, Twitch Helix) a son seau de jetons. Tant que les
+# en-têtes de la dernière réponse sont valides (avant `reset`), c'est le
+# quota restant annoncé par l'API qui fait foi ; sinon un seau local se
+# remplit à `limit / window` jetons par seconde. Les requêtes attendent
+# leur tour par priorité, et les requêtes de fond sont abandonnées quand
+# le budget devient trop bas plutôt que d'aller chercher un 429.
+
+PRIORITY_HIGH = 0    # action d'un utilisateur (OAuth, commande)
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2     # sondages en tâche de fond
+
+
+class RateLimited(Exception):
+    pass
+
+
+class RateLimiter:
+    def __init__(self, name, limit, window, header_prefix, shed_ratio=0.1,
+                 backoff_base=1.0, backoff_max=300.0):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.header_prefix = header_prefix.lower()
+        self.shed_ratio = shed_ratio
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.tokens = float(limit)
+        self.remaining = None   # quota annoncé par l'API
+        self.reset_at = 0.0     # epoch de remise à zéro annoncée par l'API
+        self.blocked_until = 0.0
+        self.failures = 0
+        self._refilled = time.time()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = None
+
+    # --- Budget ---
+    def _refill(self, now):
+        self.tokens = min(self.limit, self.tokens + (now - self._refilled) * self.limit / self.window)
+        self._refilled = now
+
+    def available(self, now=None):
+        now = now or time.time()
+        if self.remaining is not None and now < self.reset_at:
+            return self.remaining
+        self._refill(now)
+        return int(self.tokens)
+
+    def _take(self, now):
+        if self.remaining is not None and now < self.reset_at:
+            self.remaining -= 1
+        else:
+            self.tokens -= 1
+
+    def _delay(self, now):
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.remaining is not None and now < self.reset_at:
+            return self.reset_at - now
+        return max((1 - self.tokens) * self.window / self.limit, 0.05)
+
+    def budget(self):
+        now = time.time()
+        return {
+            "api": self.name,
+            "available": self.available(now),
+            "limit": self.limit,
+            "reset_in": max(self.reset_at - now, 0.0),
+            "blocked_for": max(self.blocked_until - now, 0.0),
+            "queued": len(self._waiters)
+        }
+
+    def pace(self, base_interval, calls=1):
+        # Intervalle de sondage qui tient dans le budget jusqu'au prochain reset
+        b = self.budget()
+        if b["blocked_for"]:
+            return max(base_interval, b["blocked_for"])
+        if b["reset_in"] and self.remaining is not None:
+            return max(base_interval, b["reset_in"] * calls / max(b["available"], 1))
+        return max(base_interval, self.window * calls / self.limit)
+
+    # --- Acquisition ---
+    async def acquire(self, priority=PRIORITY_NORMAL):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        if priority >= PRIORITY_LOW and self.available() <= self.limit * self.shed_ratio:
+            raise RateLimited(f"Budget {self.name} trop bas, requête abandonnée")
+        entry = (priority, next(self._seq))
+        heapq.heappush(self._waiters, entry)
+        try:
+            async with self._cond:
+                while True:
+                    now = time.time()
+                    if self._waiters[0] == entry and now >= self.blocked_until and self.available(now) >= 1:
+                        heapq.heappop(self._waiters)
+                        self._take(now)
+                        self._cond.notify_all()
+                        return
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), self._delay(now))
+                    except asyncio.TimeoutError:
+                        pass
+        except BaseException:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    # --- Retour des réponses ---
+    def update(self, headers):
+        prefix = self.header_prefix
+        try:
+            limit = headers.get(f"{prefix}limit")
+            remaining = headers.get(f"{prefix}remaining")
+            reset = headers.get(f"{prefix}reset")
+            if limit:
+                self.limit = int(limit)
+            if remaining is not None and reset:
+                self.remaining = int(remaining)
+                self.reset_at = float(reset)
+        except ValueError:
+            pass
+
+    def success(self):
+        self.failures = 0
+
+    def backoff(self, headers=None):
+        # Après un 429 : on attend le reset annoncé, ou un délai exponentiel avec gigue
+        if headers is not None:
+            self.update(headers)
+        self.failures += 1
+        now = time.time()
+        delay = min(self.backoff_base * 2 ** (self.failures - 1), self.backoff_max)
+        delay *= random.uniform(0.5, 1.5)
+        until = max(now + delay, self.reset_at + random.uniform(0, 1))
+        self.blocked_until = min(until, now + self.backoff_max)
+        self.remaining = 0 if self.reset_at > now else self.remaining
+        return self.blocked_until - now
+
+
+twitter_limiter = RateLimiter("twitter", limit=900, window=900, header_prefix="x-rate-limit-")
+twitch_limiter = RateLimiter("twitch", limit=800, window=60, header_prefix="ratelimit-")
@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import uuid
+import asyncio
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from httpclient import http_client
+from eventsub import sign, HEADER_ID, HEADER_TIMESTAMP, HEADER_SIGNATURE, HEADER_TYPE
+
+# Rejoue des payloads EventSub signés contre le webhook local du bot :
+#   python replay_eventsub.py [http://localhost:8080/webhook]
+
+load_dotenv()
+
+TWITCH_EVENTSUB_SECRET = os.getenv("TWITCH_EVENTSUB_SECRET")
+DEFAULT_URL = f"http://localhost:{os.getenv('PORT', 8080)}/webhook"
+
+BROADCASTER = {"broadcaster_user_id": "1337", "broadcaster_user_login": "titise95", "broadcaster_user_name": "Titise95"}
+VIEWER = {"user_id": "4242", "user_login": "viewer42", "user_name": "Viewer42"}
+
+
+def payload(sub_type, event=None, challenge=None):
+    p = {"subscription": {"id": str(uuid.uuid4()), "type": sub_type, "version": "1", "status": "enabled"}}
+    if event is not None:
+        p["event"] = event
+    if challenge is not None:
+        p["challenge"] = challenge
+    return p
+
+
+async def send(url, msg_type, body, message_id=None, secret=TWITCH_EVENTSUB_SECRET):
+    raw = json.dumps(body).encode()
+    message_id = message_id or str(uuid.uuid4())
+    timestamp = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    headers = {
+        HEADER_ID: message_id,
+        HEADER_TIMESTAMP: timestamp,
+        HEADER_SIGNATURE: sign(secret, message_id, timestamp, raw),
+        HEADER_TYPE: msg_type,
+        "Content-Type": "application/json"
+    }
+    async with http_client.post(url, data=raw, headers=headers) as resp:
+        return resp.status, await resp.text()
+
+
+async def main(url):
+    stream_id = str(uuid.uuid4().int)[:11]
+    cases = [
+        ("challenge", "webhook_callback_verification", payload("stream.online", challenge="pong"), None, TWITCH_EVENTSUB_SECRET, (200, "pong")),
+        ("stream.online", "notification", payload("stream.online", {**BROADCASTER, "id": stream_id, "type": "live"}), "dup-1", TWITCH_EVENTSUB_SECRET, (204, "")),
+        ("rejeu stream.online", "notification", payload("stream.online", {**BROADCASTER, "id": stream_id, "type": "live"}), "dup-1", TWITCH_EVENTSUB_SECRET, (204, "")),
+        ("channel.follow", "notification", payload("channel.follow", {**BROADCASTER, **VIEWER}), None, TWITCH_EVENTSUB_SECRET, (204, "")),
+        ("channel.subscribe", "notification", payload("channel.subscribe", {**BROADCASTER, **VIEWER, "tier": "1000", "is_gift": False}), None, TWITCH_EVENTSUB_SECRET, (204, "")),
+        ("stream.offline", "notification", payload("stream.offline", BROADCASTER), None, TWITCH_EVENTSUB_SECRET, (204, "")),
+        ("mauvaise signature", "notification", payload("stream.offline", BROADCASTER), None, "mauvais-secret", (403, None)),
+    ]
+    failures = 0
+    try:
+        for name, msg_type, body, message_id, secret, (status, text) in cases:
+            # L'id du rejeu doit être unique par exécution, sinon le bot l'ignore dès la 1re fois
+            mid = f"{message_id}-{stream_id}" if message_id else None
+            got_status, got_text = await send(url, msg_type, body, mid, secret)
+            ok = got_status == status and (text is None or got_text == text)
+            failures += not ok
+            print(f"{'✅' if ok else '❌'} {name} -> {got_status} {got_text!r}")
+    finally:
+        await http_client.close()
+    return failures
+
+
+if __name__ == "__main__":
+    if not TWITCH_EVENTSUB_SECRET:
+        sys.exit("TWITCH_EVENTSUB_SECRET doit être défini (le même que pour le bot)")
+    sys.exit(1 if asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_URL)) else 0)
@@ -0,0 +1,238 @@
+import os
+import json
+import logging
+
+# --- Configuration typée ---
+# Une seule source, validée au démarrage puis gardée en mémoire. Ordre de
+# priorité pour chaque champ : surcharge du serveur (section "guilds" de
+# config.json) > valeur de premier niveau de config.json > variable
+# d'environnement > défaut ci-dessous.
+#   {"prefix": "!", "squad_empty_grace": 30,
+#    "guilds": {"<guild_id>": {"log_channel_id": 123, ...}}}
+# config.json peut être rechargé à chaud (!config reload, ou modification du
+# fichier détectée par le bot). Un fichier invalide est refusé en bloc et la
+# configuration en place est conservée. Les secrets (tokens, client secrets,
+# port du webhook, shards) restent dans l'environnement et exigent un redémarrage.
+
+CONFIG_FILE = os.getenv("CONFIG_FILE", "config.json")
+
+# champ -> (type, variable d'environnement, défaut) ; surchargeable par serveur
+GUILD_FIELDS = {
+    "prefix": (str, "COMMAND_PREFIX", "!"),
+    "squad_vc_category_id": (int, "SQUAD_VC_CATEGORY_ID", 0),
+    "squad_announce_channel_id": (int, "SQUAD_ANNOUNCE_CHANNEL_ID", 0),
+    "squad_text_channel_id": (int, "SQUAD_TEXT_CHANNEL_ID", 0),
+    "membre_role_id": (int, "MEMBRE_ROLE_ID", 0),
+    "guide_channel_id": (int, "GUIDE_CHANNEL_ID", 0),
+    "log_channel_id": (int, "LOG_CHANNEL_ID", 0),
+    "log_arrivants_channel_id": (int, "LOG_CHANNEL_ARRIVANTS_CHANNEL_ID", 0),
+    "log_channel_update_channel_id": (int, "LOG_CHANNEL_UPDATE_CHANNEL_ID", 0),
+    "twitch_alert_channel_id": (int, "TWITCH_ALERT_CHANNEL_ID", 0),
+    "twitch_follower_role_id": (int, "TWITCH_FOLLOWER_ROLE_ID", 0),
+    "twitter_alert_channel_id": (int, "TWITTER_ALERT_CHANNEL_ID", 0),
+    "temp_vc_trigger_id": (int, "TEMP_VC_TRIGGER_ID", 0),
+    "spam_timeout_minutes": (int, "SPAM_TIMEOUT_MINUTES", 10)
+}
+
+# champs communs à tout le bot
+COMMON_FIELDS = {
+    "squad_empty_grace": (int, "SQUAD_EMPTY_GRACE", 30),
+    "temp_vc_grace": (int, "TEMP_VC_GRACE", 60),
+    "twitch_streamer_login": (str, "TWITCH_STREAMER_LOGIN", ""),
+    # Streamers partenaires surveillés (à défaut, le streamer principal)
+    "twitch_streamer_logins": (list, "TWITCH_STREAMER_LOGINS", []),
+    # Mettre à false une fois les abonnements stream.online/offline créés (subscribe.py)
+    "twitch_polling": (bool, "TWITCH_POLLING", True),
+    # Extensions (cogs/) chargées au démarrage ; la liste est resynchronisée au rechargement
+    "extensions": (list, "EXTENSIONS", ["levels", "moderation", "roles", "tempvc", "twitch_alerts"]),
+    # Anti-spam / anti-raid (antiraid.Thresholds) : N messages en X secondes, etc.
+    "spam_msg_count": (int, "SPAM_MSG_COUNT", 6),
+    "spam_msg_window": (float, "SPAM_MSG_WINDOW", 5.0),
+    "spam_dup_count": (int, "SPAM_DUP_COUNT", 4),
+    "spam_dup_window": (float, "SPAM_DUP_WINDOW", 30.0),
+    "raid_join_count": (int, "RAID_JOIN_COUNT", 10),
+    "raid_join_window": (float, "RAID_JOIN_WINDOW", 10.0),
+    "raid_lockdown_cooldown": (float, "RAID_LOCKDOWN_COOLDOWN", 600.0),
+    "raid_ban": (bool, "RAID_BAN", False),
+    # Messages gardés par salon pour journaliser éditions et suppressions
+    "audit_cache_per_channel": (int, "AUDIT_CACHE_PER_CHANNEL", 200)
+}
+
+# Compteurs et tailles de tampons : 0 désactiverait la détection ou ferait tout déclencher
+POSITIVE_FIELDS = {"spam_msg_count", "spam_dup_count", "raid_join_count", "audit_cache_per_channel"}
+
+
+class ConfigError(Exception):
+    pass
+
+
+def convert(name, kind, value):
+    try:
+        if kind is bool:
+            if isinstance(value, bool):
+                return value
+            if str(value).strip().lower() in ("1", "true", "oui", "on"):
+                return True
+            if str(value).strip().lower() in ("0", "false", "non", "off"):
+                return False
+            raise ValueError(value)
+        if kind is list:
+            items = value.split(",") if isinstance(value, str) else list(value)
+            return [str(v).strip() for v in items if str(v).strip()]
+        if kind in (int, float):
+            if isinstance(value, bool):
+                raise ValueError(value)
+            value = kind(value)
+            if value < 0 or (value == 0 and name in POSITIVE_FIELDS):
+                raise ValueError(value)
+            return value
+        return str(value)
+    except (TypeError, ValueError):
+        raise ConfigError(f"{name} : valeur invalide {value!r} (attendu : {kind.__name__})")
+
+
+def _section(fields, raw, where):
+    if not isinstance(raw, dict):
+        raise ConfigError(f"{where} : objet JSON attendu, pas {type(raw).__name__}")
+    unknown = set(raw) - set(fields)
+    if unknown:
+        raise ConfigError(f"{where} : champ(s) inconnu(s) {', '.join(sorted(unknown))}")
+    return {k: convert(k, fields[k][0], v) for k, v in raw.items()}
+
+
+class _Config:
+    __slots__ = ()
+
+    def __init__(self, values: dict):
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class CommonConfig(_Config):
+    __slots__ = tuple(COMMON_FIELDS)
+
+    @property
+    def streamer_logins(self):
+        return self.twitch_streamer_logins or ([self.twitch_streamer_login] if self.twitch_streamer_login else [])
+
+
+class GuildConfig(_Config):
+    __slots__ = ("guild_id",) + tuple(GUILD_FIELDS)
+
+    def __init__(self, guild_id, values: dict):
+        self.guild_id = guild_id
+        super().__init__(values)
+
+
+class Settings:
+    def __init__(self, path=CONFIG_FILE):
+        self.path = path
+        self.mtime = None
+        self.common = None
+        self.guild_defaults = {}
+        self.overrides = {}  # guild_id -> {champ: valeur}
+        self._cache = {}     # guild_id -> GuildConfig
+        self._listeners = []
+        self.load()
+
+    def _env_defaults(self, fields):
+        values = {}
+        for name, (kind, env, default) in fields.items():
+            raw = os.getenv(env)
+            values[name] = default if raw is None else convert(env, kind, raw)
+        return values
+
+    def _read(self):
+        raw = {}
+        mtime = None
+        if os.path.exists(self.path):
+            mtime = os.stat(self.path).st_mtime
+            with open(self.path, "r") as f:
+                try:
+                    raw = json.load(f)
+                except json.JSONDecodeError as e:
+                    raise ConfigError(f"{self.path} : JSON invalide ({e})")
+        if not isinstance(raw, dict):
+            raise ConfigError(f"{self.path} : objet JSON attendu, pas {type(raw).__name__}")
+        guilds = raw.pop("guilds", {})
+        if not isinstance(guilds, dict):
+            raise ConfigError(f"guilds : objet JSON attendu, pas {type(guilds).__name__}")
+        top_guild = {k: v for k, v in raw.items() if k in GUILD_FIELDS}
+        top_common = {k: v for k, v in raw.items() if k not in GUILD_FIELDS}
+        common = {**self._env_defaults(COMMON_FIELDS), **_section(COMMON_FIELDS, top_common, self.path)}
+        guild_defaults = {**self._env_defaults(GUILD_FIELDS), **_section(GUILD_FIELDS, top_guild, self.path)}
+        overrides = {}
+        for gid, values in guilds.items():
+            if not str(gid).isdigit():
+                raise ConfigError(f"guilds : identifiant de serveur invalide {gid!r}")
+            overrides[int(gid)] = _section(GUILD_FIELDS, values, f"guilds.{gid}")
+        return mtime, CommonConfig(common), guild_defaults, overrides
+
+    def load(self):
+        # Lève ConfigError : au démarrage, une configuration invalide arrête le bot
+        self.mtime, self.common, self.guild_defaults, self.overrides = self._read()
+        self._cache.clear()
+        logging.info(f"⚙️ Configuration chargée ({len(self.overrides)} serveur(s) surchargé(s))")
+        for callback in self._listeners:
+            try:
+                callback(self)
+            except Exception as e:
+                logging.error(f"Application de la configuration impossible : {e}")
+
+    def reload(self):
+        # À chaud : renvoie None si tout va bien, sinon le message d'erreur
+        try:
+            self.load()
+        except (ConfigError, OSError) as e:
+            logging.error(f"Configuration non rechargée : {e}")
+            return str(e)
+        return None
+
+    def changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        return mtime != self.mtime
+
+    def on_reload(self, callback):
+        # callback(settings) : appelé après chaque chargement réussi
+        self._listeners.append(callback)
+        return callback
+
+    def guild(self, guild_id) -> GuildConfig:
+        cfg = self._cache.get(guild_id)
+        if cfg is None:
+            cfg = self._cache[guild_id] = GuildConfig(
+                guild_id, {**self.guild_defaults, **self.overrides.get(guild_id, {})}
+            )
+        return cfg
+
+    def set_guild(self, guild_id, name, value):
+        # Surcharge un champ pour un serveur et l'écrit dans config.json
+        if name not in GUILD_FIELDS:
+            raise ConfigError(f"champ inconnu {name!r}")
+        value = convert(name, GUILD_FIELDS[name][0], value)
+        raw = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                try:
+                    raw = json.load(f)
+                except json.JSONDecodeError as e:
+                    raise ConfigError(f"{self.path} : JSON invalide ({e})")
+        if not isinstance(raw, dict) or not isinstance(raw.get("guilds", {}), dict) \
+                or not isinstance(raw.get("guilds", {}).get(str(guild_id), {}), dict):
+            raise ConfigError(f"{self.path} : structure invalide, corriger le fichier avant !config set")
+        raw.setdefault("guilds", {}).setdefault(str(guild_id), {})[name] = value
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(raw, f, indent=4, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        self.load()
+        return value
+
+
+settings = Settings()
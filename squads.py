@@ -0,0 +1,148 @@
+import discord
+
+# --- Registre des squads actives ---
+# Associe chaque salon vocal de squad à son message d'annonce. Le message est
+# gardé sous forme de PartialMessage (édition/suppression sans fetch préalable)
+# et la liste des membres est tenue à jour à partir des événements vocaux
+# plutôt que de re-parcourir `vc.members` à chaque fois.
+# `states` donne, pour chaque serveur, le dict persisté "active_squads" :
+#   {vc_id: {"channel_id", "message_id", "max_members", "game"}}
+
+
+class Squad:
+    __slots__ = ("vc_id", "guild_id", "name", "game", "max_members", "channel_id", "message_id", "message",
+                 "view", "members")
+
+    def __init__(self, vc_id, guild_id, name, game, max_members, channel_id=None, message_id=None, message=None):
+        self.vc_id = vc_id
+        self.guild_id = guild_id
+        self.name = name
+        self.game = game
+        self.max_members = max_members
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.message = message
+        self.view = None
+        self.members = {}  # member_id -> display_name, dans l'ordre d'arrivée
+
+    @property
+    def full(self):
+        return len(self.members) >= self.max_members
+
+    def to_state(self):
+        return {
+            "channel_id": self.channel_id,
+            "message_id": self.message_id,
+            "max_members": self.max_members,
+            "game": self.game
+        }
+
+    def embed(self):
+        lines = [
+            f"🎮 Jeu : **{self.game}**",
+            f"👥 Joueurs : {len(self.members)}/{self.max_members}",
+            ""
+        ]
+        if self.members:
+            lines += ["👤 Membres :"] + [f"• {name}" for name in self.members.values()]
+        else:
+            lines.append("👤 Aucun pour l'instant")
+        return discord.Embed(title=self.name, description="\n".join(lines), color=discord.Color.green())
+
+
+class SquadRegistry:
+    def __init__(self, bot, states):
+        self.bot = bot
+        self.states = states
+        self.squads = {}  # vc_id -> Squad
+        self.rebuilt = False
+
+    def __contains__(self, vc_id):
+        return vc_id in self.squads
+
+    def __len__(self):
+        return len(self.squads)
+
+    def get(self, vc_id):
+        return self.squads.get(vc_id)
+
+    def add(self, vc: discord.VoiceChannel, max_members: int, game: str):
+        # Enregistré avant l'envoi de l'annonce pour ne rater aucun événement vocal
+        squad = Squad(vc.id, vc.guild.id, vc.name, game, max_members)
+        squad.members = {m.id: m.display_name for m in vc.members if not m.bot}
+        self.squads[vc.id] = squad
+        return squad
+
+    def attach(self, squad: Squad, message: discord.Message):
+        squad.channel_id = message.channel.id
+        squad.message_id = message.id
+        squad.message = message
+        self.states(squad.guild_id)[str(squad.vc_id)] = squad.to_state()
+
+    def remove(self, vc_id):
+        squad = self.squads.pop(vc_id, None)
+        if squad:
+            self.states(squad.guild_id).pop(str(vc_id), None)
+        return squad
+
+    def rebuild(self):
+        # Au démarrage : reconstruit le registre depuis l'état persisté.
+        # Renvoie les squads dont le salon vocal a disparu pendant l'arrêt.
+        # Seuls les serveurs visibles par ce processus (ses shards) sont traités.
+        stale = []
+        for guild_id, state in self.states.items():
+            if self.bot.get_guild(guild_id) is None:
+                continue
+            for key, info in list(state.items()):
+                vc = self.bot.get_channel(int(key))
+                announce = self.bot.get_channel(info.get("channel_id", 0))
+                message = announce.get_partial_message(info["message_id"]) if announce else None
+                squad = Squad(
+                    int(key),
+                    guild_id,
+                    vc.name if vc else "",
+                    info.get("game") or (vc.name.split(" - ")[0] if vc else ""),
+                    info.get("max_members") or (vc.user_limit if vc else 0),
+                    info.get("channel_id"),
+                    info.get("message_id"),
+                    message
+                )
+                if vc is None:
+                    state.pop(key, None)
+                    stale.append(squad)
+                    continue
+                squad.members = {m.id: m.display_name for m in vc.members if not m.bot}
+                self.squads[squad.vc_id] = squad
+                state[key] = squad.to_state()
+        self.rebuilt = True
+        return stale
+
+    def refresh(self):
+        # Après une reconnexion : resynchronise les membres depuis le cache
+        # (sans appel API) et renvoie les squads dont la composition a changé
+        changed = []
+        for squad in self.squads.values():
+            vc = self.bot.get_channel(squad.vc_id)
+            if vc is None:
+                continue
+            members = {m.id: m.display_name for m in vc.members if not m.bot}
+            if members.keys() != squad.members.keys():
+                squad.members = members
+                changed.append(squad)
+        return changed
+
+    def on_voice_state_update(self, member, before, after):
+        # Met à jour les membres et renvoie les squads dont la composition a changé
+        if member.bot or before.channel == after.channel:
+            return []
+        changed = []
+        if before.channel and before.channel.id in self.squads:
+            squad = self.squads[before.channel.id]
+            if squad.members.pop(member.id, None) is not None:
+                changed.append(squad)
+        if after.channel and after.channel.id in self.squads:
+            squad = self.squads[after.channel.id]
+            if member.id not in squad.members:
+                squad.members[member.id] = member.display_name
+                changed.append(squad)
+        return changed
@@ -0,0 +1,362 @@
+import os
+import json
+import sqlite3
+import time
+import asyncio
+import logging
+import threading
+
+# --- Stockage persistant ---
+# Les clés de premier niveau de `data` sont stockées chacune dans une ligne
+# SQLite (mode WAL). Un flush ne réécrit que les clés dont la valeur a changé,
+# et l'écriture disque se fait hors de la boucle asyncio.
+# save_data(data, *clés) ne fait que marquer ces clés comme modifiées : seules
+# elles sont resérialisées au flush, le coût ne dépend donc pas de la taille
+# totale des données. Les clés ajoutées ou retirées de `data` sont détectées
+# sans sérialiser le reste ; sans clé, tout est comparé (migrations). Un flush a lieu
+# au plus tard FLUSH_INTERVAL_MS après la première mutation, ou dès que
+# FLUSH_MAX_MUTATIONS mutations sont en attente (write-behind).
+# Les données propres à un serveur vivent sous des clés "guild:<id>:<nom>"
+# (guild:<id>:xp, guild:<id>:active_squads...) : chaque sous-clé est une ligne
+# à part, si bien qu'un squad rejoint ne réécrit pas l'XP du serveur, et les
+# données d'un serveur peuvent être déplacées vers un autre processus (shards
+# répartis) sans toucher au reste.
+
+DATA_FILE = "data.json"
+DB_FILE = os.getenv("DATA_DB_FILE", "data.db")
+COMPACT_EVERY = 200  # checkpoint du WAL tous les N flushs
+FLUSH_INTERVAL_MS = int(os.getenv("DATA_FLUSH_INTERVAL_MS", 2000))
+FLUSH_MAX_MUTATIONS = int(os.getenv("DATA_FLUSH_MAX_MUTATIONS", 50))
+
+GUILD_PREFIX = "guild:"
+# Anciennes clés de premier niveau qui appartiennent en fait à un serveur
+GUILD_KEYS = (
+    "reglement_message_id", "guide_message_id", "giveaways", "tickets", "polls",
+    "active_squads", "ephemeral_vcs", "xp", "voice_time", "voice_sessions"
+)
+
+DEFAULT_DATA = {
+    "linked_accounts": {},
+    "link_states": {},
+    "twitter_dedupe": {},
+    "twitch_subscribers": {},
+    "twitch_live": {}
+}
+
+
+def _dump(value):
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+class DataStore:
+    def __init__(self, db_path=DB_FILE, legacy_path=DATA_FILE,
+                 flush_interval_ms=FLUSH_INTERVAL_MS, max_mutations=FLUSH_MAX_MUTATIONS):
+        self.db_path = db_path
+        self.legacy_path = legacy_path
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_mutations = max_mutations
+        self.data = None
+        self._conn = None
+        self._written = {}  # clé -> JSON actuellement sur disque
+        self._dirty = set()  # clés modifiées depuis le dernier flush
+        self._all_dirty = False
+        self._db_lock = threading.Lock()
+        self._flush_lock = None
+        self._flush_task = None
+        self._wake = None
+        self._pending = 0  # mutations en attente depuis le dernier flush
+        self.stats = {
+            "flushes": 0,
+            "mutations": 0,
+            "keys_written": 0,
+            "last_batch": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0
+        }
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.commit()
+        return conn
+
+    def load(self):
+        if self.data is not None:
+            return self.data
+        self._conn = self._connect()
+        rows = self._conn.execute("SELECT key, value FROM kv").fetchall()
+        if rows:
+            self.data = {k: json.loads(v) for k, v in rows}
+            self._written = dict(rows)
+        elif os.path.exists(self.legacy_path):
+            self.data = self._migrate_json()
+        else:
+            self.data = json.loads(_dump(DEFAULT_DATA))
+        for k, v in DEFAULT_DATA.items():
+            self.data.setdefault(k, json.loads(_dump(v)))
+        upgraded = split_guild_rows(self.data) + split_raid_lockdowns(self.data)
+        if upgraded:
+            self._all_dirty = True
+            self.flush_sync()
+        return self.data
+
+    def _migrate_json(self):
+        # Import unique de l'ancien data.json (laissé intact sur le disque)
+        with open(self.legacy_path, "r") as f:
+            legacy = json.load(f)
+        changes = {k: _dump(v) for k, v in legacy.items()}
+        self._write(changes, [])
+        self._written.update(changes)
+        logging.info(f"📦 {self.legacy_path} migré vers {self.db_path} ({len(changes)} clés)")
+        return legacy
+
+    # --- Calcul et écriture des différences ---
+    def _take_dirty(self):
+        if self._all_dirty:
+            keys = set(self.data)
+        else:
+            keys = self._dirty | (self.data.keys() - self._written.keys())
+        self._dirty = set()
+        self._all_dirty = False
+        return keys
+
+    def _diff(self, keys):
+        changes = {}
+        for k in keys:
+            if k not in self.data:
+                continue
+            s = _dump(self.data[k])
+            if self._written.get(k) != s:
+                changes[k] = s
+        deleted = [k for k in self._written.keys() - self.data.keys()]
+        return changes, deleted
+
+    def _write(self, changes, deleted):
+        with self._db_lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO kv (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    changes.items()
+                )
+                self._conn.executemany("DELETE FROM kv WHERE key = ?", [(k,) for k in deleted])
+
+    def _commit(self, changes, deleted, mutations, started):
+        self._written.update(changes)
+        for k in deleted:
+            self._written.pop(k, None)
+        elapsed = (time.perf_counter() - started) * 1000
+        st = self.stats
+        st["flushes"] += 1
+        st["mutations"] += mutations
+        st["keys_written"] += len(changes) + len(deleted)
+        st["last_batch"] = mutations
+        st["last_flush_ms"] = elapsed
+        st["max_flush_ms"] = max(st["max_flush_ms"], elapsed)
+        st["total_flush_ms"] += elapsed
+
+    def get_stats(self):
+        st = dict(self.stats)
+        n = st["flushes"] or 1
+        st["pending"] = self._pending
+        st["avg_flush_ms"] = st["total_flush_ms"] / n
+        st["avg_batch"] = st["mutations"] / n
+        return st
+
+    def compact(self):
+        # Replie le WAL dans la base principale (atomique côté SQLite)
+        with self._db_lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def flush_sync(self):
+        if self.data is None:
+            return 0
+        started = time.perf_counter()
+        mutations, self._pending = self._pending, 0
+        changes, deleted = self._diff(self._take_dirty())
+        if changes or deleted:
+            self._write(changes, deleted)
+            self._commit(changes, deleted, mutations, started)
+        return len(changes) + len(deleted)
+
+    async def flush(self):
+        if self.data is None or self._conn is None:
+            return 0
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            # La sérialisation se fait sur la boucle (instantané cohérent),
+            # seule l'écriture disque part dans un thread.
+            started = time.perf_counter()
+            mutations, self._pending = self._pending, 0
+            keys = self._take_dirty()
+            changes, deleted = self._diff(keys)
+            if not changes and not deleted:
+                return 0
+            try:
+                await asyncio.to_thread(self._write, changes, deleted)
+            except Exception:
+                self._pending += mutations
+                self._dirty |= keys
+                raise
+            self._commit(changes, deleted, mutations, started)
+            if self.stats["flushes"] % COMPACT_EVERY == 0:
+                await asyncio.to_thread(self.compact)
+            return len(changes) + len(deleted)
+
+    def mark_dirty(self, keys=(), count=1):
+        # Sans clé : toutes les données seront comparées au prochain flush
+        if keys:
+            self._dirty.update(keys)
+        else:
+            self._all_dirty = True
+        self._pending += count
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_sync()
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._wake = asyncio.Event()
+            self._flush_task = loop.create_task(self._write_behind())
+        if self._pending >= self.max_mutations:
+            self._wake.set()
+
+    async def _write_behind(self):
+        # Les mutations arrivées pendant l'écriture déclenchent un flush de plus
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"Échec de la sauvegarde des données : {e}")
+
+    async def flush_pending(self):
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self.flush()
+
+    async def close(self):
+        if self._conn is None:
+            return
+        await self.flush_pending()
+        await asyncio.to_thread(self.compact)
+        self._conn.close()
+        self._conn = None
+
+
+store = DataStore()
+
+
+def load_data():
+    return store.load()
+
+
+def save_data(data, *keys):
+    if data is not store.data:
+        store.data = data
+    store.mark_dirty(keys)
+
+
+# --- Données par serveur ---
+def guild_key(guild_id, name):
+    # Clé de premier niveau (et ligne SQLite) d'une sous-clé d'un serveur
+    return f"{GUILD_PREFIX}{guild_id}:{name}"
+
+
+def _parse_guild_key(key):
+    # "guild:<id>:<nom>" -> (id, nom), sinon None
+    if not key.startswith(GUILD_PREFIX):
+        return None
+    guild_id, _, name = key[len(GUILD_PREFIX):].partition(":")
+    if not guild_id.isdigit() or not name:
+        return None
+    return int(guild_id), name
+
+
+def guild_ids(data):
+    return sorted({parsed[0] for parsed in map(_parse_guild_key, data) if parsed})
+
+
+def _merge(data, key, value):
+    # Les dicts sont fusionnés en place (les valeurs déjà rangées l'emportent)
+    current = data.get(key)
+    if isinstance(value, dict) and isinstance(current, dict):
+        for k, v in value.items():
+            current.setdefault(k, v)
+    else:
+        data.setdefault(key, value)
+
+
+class GuildState:
+    # Même sous-clé dans chaque serveur : state(guild_id) -> data["guild:<id>:<name>"]
+    def __init__(self, data, name):
+        self.data = data
+        self.name = name
+
+    def __call__(self, guild_id) -> dict:
+        return self.data.setdefault(self.key(guild_id), {})
+
+    def key(self, guild_id):
+        return guild_key(guild_id, self.name)
+
+    def save(self, guild_id):
+        save_data(self.data, self.key(guild_id))
+
+    def items(self):
+        for key, value in list(self.data.items()):
+            parsed = _parse_guild_key(key)
+            if parsed and parsed[1] == self.name:
+                yield parsed[0], value
+
+
+def split_guild_rows(data):
+    # Éclate les anciennes lignes "guild:<id>" (un dict par serveur) en une
+    # ligne par sous-clé. Renvoie les serveurs convertis.
+    converted = []
+    for key in [k for k in data if k.startswith(GUILD_PREFIX) and k[len(GUILD_PREFIX):].isdigit()]:
+        guild_id = int(key[len(GUILD_PREFIX):])
+        for name, value in data.pop(key).items():
+            _merge(data, guild_key(guild_id, name), value)
+        converted.append(guild_id)
+    if converted:
+        logging.info(f"📦 {len(converted)} serveur(s) passé(s) à une ligne par sous-clé")
+    return converted
+
+
+def split_raid_lockdowns(data):
+    # Ancien dict global {guild_id: niveau de vérification d'avant le lockdown},
+    # éventuellement déjà rangé tel quel sous un serveur : chaque niveau va dans
+    # "guild:<id>:raid_lockdown", que lit !unlock. Renvoie les serveurs convertis.
+    sources = [k for k in data if k == "raid_lockdowns" or (k.endswith(":raid_lockdowns") and _parse_guild_key(k))]
+    converted = []
+    for key in sources:
+        for guild_id, level in data.pop(key).items():
+            if str(guild_id).isdigit() and level is not None:
+                data.setdefault(guild_key(guild_id, "raid_lockdown"), level)
+                converted.append(int(guild_id))
+    if converted:
+        logging.info(f"📦 Lockdown en cours repris pour {len(converted)} serveur(s)")
+    return converted
+
+
+def migrate_to_guild(data, guild_id):
+    # Range les clés d'avant le mode multi-serveur sous le serveur d'origine
+    moved = [k for k in GUILD_KEYS if k in data]
+    for key in moved:
+        _merge(data, guild_key(guild_id, key), data.pop(key))
+    if moved:
+        logging.info(f"📦 {len(moved)} clé(s) rangée(s) sous le serveur {guild_id}")
+    return moved
@@ -1,14 +1,22 @@
 import os
+import sys
 import asyncio
-import aiohttp
 from dotenv import load_dotenv
 
+from httpclient import http_client
+
 load_dotenv()
 
+# Après load_dotenv : settings lit l'environnement au chargement
+from settings import settings
+
 TWITCH_CLIENT_ID = os.getenv("TWITCH_CLIENT_ID")
 TWITCH_CLIENT_SECRET = os.getenv("TWITCH_CLIENT_SECRET")
-TWITCH_STREAMER_LOGIN = os.getenv("TWITCH_STREAMER_LOGIN")
+TWITCH_STREAMER_LOGIN = settings.common.twitch_streamer_login
+TWITCH_STREAMER_LOGINS = settings.common.streamer_logins
 WEBHOOK_CALLBACK_URL = os.getenv("WEBHOOK_CALLBACK_URL")  # L'URL publique de ton webhook Railway
+# Doit être identique au secret utilisé par main.py pour vérifier les signatures
+TWITCH_EVENTSUB_SECRET = os.getenv("TWITCH_EVENTSUB_SECRET")
 
 async def get_oauth_token():
     url = "https://id.twitch.tv/oauth2/token"
@@ -17,21 +25,23 @@ async def get_oauth_token():
         "client_secret": TWITCH_CLIENT_SECRET,
         "grant_type": "client_credentials"
     }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, params=params) as resp:
-            data = await resp.json()
-            return data.get("access_token")
+    async with http_client.post(url, params=params) as resp:
+        data = await resp.json()
+        return data.get("access_token")
 
-async def get_user_id(token):
-    url = f"https://api.twitch.tv/helix/users?login={TWITCH_STREAMER_LOGIN}"
+async def get_user_ids(token, logins):
+    url = "https://api.twitch.tv/helix/users"
     headers = {
         "Client-ID": TWITCH_CLIENT_ID,
         "Authorization": f"Bearer {token}"
     }
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, headers=headers) as resp:
+    ids = {}
+    for i in range(0, len(logins), 100):
+        params = [("login", l) for l in logins[i:i + 100]]
+        async with http_client.get(url, headers=headers, params=params) as resp:
             data = await resp.json()
-            return data["data"][0]["id"]
+            ids.update({u["login"]: u["id"] for u in data.get("data", [])})
+    return ids
 
 async def create_eventsub_subscription(token, user_id, type_, callback_url):
     url = "https://api.twitch.tv/helix/eventsub/subscriptions"
@@ -49,26 +59,37 @@ async def create_eventsub_subscription(token, user_id, type_, callback_url):
         "transport": {
             "method": "webhook",
             "callback": callback_url,
-            "secret": "monsecretpourverifier"  # À changer, voir plus bas
+            "secret": TWITCH_EVENTSUB_SECRET
         }
     }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=json_data) as resp:
-            resp_data = await resp.json()
-            print(f"Création abonnement {type_} :", resp_data)
+    async with http_client.post(url, headers=headers, json=json_data) as resp:
+        resp_data = await resp.json()
+        print(f"Création abonnement {type_} :", resp_data)
 
 async def main():
-    token = await get_oauth_token()
-    user_id = await get_user_id(token)
+    try:
+        token = await get_oauth_token()
+        user_ids = await get_user_ids(token, [l.lower() for l in TWITCH_STREAMER_LOGINS])
+
+        # Lives de tous les streamers suivis (remplace le sondage de twitch_check_loop)
+        for user_id in user_ids.values():
+            for event_type in ("stream.online", "stream.offline"):
+                await create_eventsub_subscription(token, user_id, event_type, WEBHOOK_CALLBACK_URL)
 
-    # Types d’événements que tu veux suivre
-    event_types = [
-        "channel.follow",           # Nouveau follower
-        "channel.subscribe"         # Nouvel abonné (t1, t2, t3 inclus)
-    ]
+        # Types d’événements que tu veux suivre sur la chaîne principale
+        event_types = [
+            "channel.follow",           # Nouveau follower
+            "channel.subscribe"         # Nouvel abonné (t1, t2, t3 inclus)
+        ]
 
-    for event_type in event_types:
-        await create_eventsub_subscription(token, user_id, event_type, WEBHOOK_CALLBACK_URL)
+        main_id = user_ids.get((TWITCH_STREAMER_LOGIN or "").lower())
+        if main_id:
+            for event_type in event_types:
+                await create_eventsub_subscription(token, main_id, event_type, WEBHOOK_CALLBACK_URL)
+    finally:
+        await http_client.close()
 
 if __name__ == "__main__":
+    if not TWITCH_EVENTSUB_SECRET:
+        sys.exit("TWITCH_EVENTSUB_SECRET doit être défini (le même que pour le bot)")
     asyncio.run(main())
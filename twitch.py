@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from httpclient import http_client
+from ratelimit import PRIORITY_LOW, twitch_limiter
+
+# --- Surveillance des lives Twitch ---
+# Les logins sont interrogés par paquets de 100 (maximum de l'API Helix) et
+# on ne remonte que les transitions entre deux sondages. `state` est le dict
+# persisté {login: stream_id} des streams vus en live, pour ne pas ré-annoncer
+# un live déjà en cours après un redémarrage.
+# Le token d'application (AppToken, partagé avec la liaison de comptes) est
+# gardé en mémoire jusqu'à TOKEN_REFRESH_MARGIN secondes de son expiration,
+# puis renouvelé par un seul appel même si plusieurs requêtes le demandent en
+# même temps.
+
+UTC = timezone.utc
+TWITCH_TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+HELIX_STREAMS_URL = "https://api.twitch.tv/helix/streams"
+HELIX_BATCH = 100
+TOKEN_REFRESH_MARGIN = 300
+
+
+class AppToken:
+    def __init__(self, client_id, client_secret):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token = None
+        self.token_expiry = None
+        self._token_lock = None
+        self.stats = {"tokens": 0}
+
+    def token_expiring(self):
+        if not self.token or self.token_expiry is None:
+            return True
+        return datetime.now(UTC) >= self.token_expiry - timedelta(seconds=TOKEN_REFRESH_MARGIN)
+
+    async def get_token(self):
+        if self._token_lock is None:
+            self._token_lock = asyncio.Lock()
+        async with self._token_lock:
+            # Déjà renouvelé par un appel concurrent pendant l'attente du verrou
+            if not self.token_expiring():
+                return self.token
+            status, d = await http_client.request_json(
+                "POST", TWITCH_TOKEN_URL,
+                params={
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
+                    "grant_type": "client_credentials"
+                }
+            )
+            if status != 200 or not d or not d.get("access_token"):
+                raise RuntimeError(f"Token Twitch refusé ({status})")
+            self.token = d["access_token"]
+            self.token_expiry = datetime.now(UTC) + timedelta(seconds=d.get("expires_in", 3600))
+            self.stats["tokens"] += 1
+            return self.token
+
+    async def headers(self):
+        if self.token_expiring():
+            await self.get_token()
+        return {"Client-ID": self.client_id, "Authorization": f"Bearer {self.token}"}
+
+    def invalidate(self):
+        self.token = None
+
+
+class TwitchMonitor:
+    def __init__(self, client_id, client_secret, logins, state, app_token: AppToken = None):
+        self.app_token = app_token or AppToken(client_id, client_secret)
+        self.logins = sorted({l.strip().lower() for l in logins if l.strip()})
+        self.state = state
+        self.stats = {"polls": 0}
+
+    @property
+    def batches(self):
+        return max(-(-len(self.logins) // HELIX_BATCH), 1)
+
+    async def fetch_batch(self, logins):
+        params = [("user_login", l) for l in logins] + [("first", str(HELIX_BATCH))]
+        status, body = await http_client.request_json(
+            "GET", HELIX_STREAMS_URL, limiter=twitch_limiter, priority=PRIORITY_LOW,
+            headers=await self.app_token.headers(), params=params
+        )
+        if status == 401:
+            self.app_token.invalidate()
+        if status != 200 or body is None:
+            raise RuntimeError(f"Helix streams a répondu {status}")
+        return body.get("data", [])
+
+    async def fetch_live(self):
+        batches = [self.logins[i:i + HELIX_BATCH] for i in range(0, len(self.logins), HELIX_BATCH)]
+        results = await asyncio.gather(*(self.fetch_batch(b) for b in batches))
+        return {s["user_login"].lower(): s for streams in results for s in streams}
+
+    async def poll(self):
+        # Renvoie (streams passés en live, logins passés hors ligne)
+        self.stats["polls"] += 1
+        try:
+            live = await self.fetch_live()
+        except Exception as e:
+            # Un paquet en échec ne doit pas faire croire que ses streams sont finis
+            logging.warning(f"Sondage Twitch impossible : {e}")
+            return [], []
+        went_live = [s for login, s in live.items() if self.state.get(login) != s.get("id")]
+        went_offline = [login for login in self.state if login not in live]
+        for s in went_live:
+            self.state[s["user_login"].lower()] = s.get("id")
+        for login in went_offline:
+            self.state.pop(login, None)
+        return went_live, went_offline